@@ -15,7 +15,10 @@ and records violations for unauthorized vehicles in restricted parking areas.
 import os
 import sys
 import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
 
 # استيراد الأدوات المشتركة
 from plate_recognition_utils import (
@@ -23,6 +26,7 @@ from plate_recognition_utils import (
     PlateRecognizerAPI,
     ConfigManager,
     FileManager,
+    ViolationWriteError,
     print_banner,
     print_summary
 )
@@ -43,6 +47,9 @@ class PlateRecognitionSystem:
         self.violation_type = config.get('violation_type')
         self.fine_amount = config.get('fine_amount')
         self.officer_name = config.get('officer_name')
+        # عدد العمال المتزامنين لاستدعاءات API (1 = معالجة تسلسلية)
+        # Concurrent API workers (1 = sequential processing)
+        self.max_workers = max(1, int(config.get('max_workers') or 1))
         
         # التحقق من صحة الإعدادات
         if not self.validate_config():
@@ -52,13 +59,23 @@ class PlateRecognitionSystem:
         FileManager.create_directories(self.input_folder, self.output_folder)
         
         # إعداد قاعدة البيانات
-        self.db_manager = DatabaseManager(config.get('database_name'))
+        self.db_manager = DatabaseManager(
+            config.get('database_name'),
+            wal_mode=bool(config.get('db_wal_mode', False)),
+            batch_size=config.get('db_batch_size') or 500,
+            cache_size=config.get('vehicle_cache_size', 4096),
+            cache_ttl=config.get('vehicle_cache_ttl', 300)
+        )
         if not self.db_manager.connect():
             raise RuntimeError("فشل الاتصال بقاعدة البيانات / Failed to connect to database")
         self.db_manager.setup_tables()
+        self.db_manager.preload_vehicles()
         
-        # إعداد واجهة API
-        self.api = PlateRecognizerAPI(self.api_token, self.api_url)
+        # إعداد واجهة API (حجم مجمع الاتصالات لا يقل عن عدد العمال)
+        self.api = PlateRecognizerAPI(
+            self.api_token, self.api_url,
+            pool_size=max(self.max_workers, PlateRecognizerAPI.DEFAULT_POOL_SIZE)
+        )
     
     def validate_config(self):
         """التحقق من صحة الإعدادات"""
@@ -103,10 +120,14 @@ class PlateRecognitionSystem:
             if vehicle:
                 # تسجيل مخالفة تلقائية
                 car_id = vehicle[0]
-                if self.db_manager.add_violation(
+                recorded = self.db_manager.add_violation(
                     car_id, plate, self.violation_type, timestamp,
                     self.fine_amount, self.officer_name
-                ):
+                )
+                if recorded == DatabaseManager.VIOLATION_QUEUED:
+                    print("⏳ المخالفة بانتظار الكتابة مع الدفعة")
+                    print("⏳ Violation queued for the batch write")
+                elif recorded:
                     print("✅ تم تسجيل مخالفة تلقائية")
                     print("✅ Violation recorded automatically")
             else:
@@ -139,30 +160,75 @@ class PlateRecognitionSystem:
         print(f"📊 عدد الصور المكتشفة / Images found: {len(images)}\n")
         
         # معالجة كل صورة
+        # الاستدعاءات تتم بالتوازي، بينما تبقى كتابة قاعدة البيانات في هذا الخيط فقط
+        # API calls run concurrently; database writes stay on this thread only
         processed = 0
         errors = 0
+        unsaved_violations = 0
         
-        for i, filename in enumerate(images, 1):
-            print(f"[{i}/{len(images)}] معالجة / Processing: {filename}")
-            full_path = os.path.join(self.input_folder, filename)
-            
-            try:
-                result = self.api.process_image(full_path)
-                self.handle_result(result, full_path)
-                processed += 1
-            except Exception as e:
-                print(f"❌ فشلت معالجة الصورة / Failed to process: {filename}")
-                print(f"   الخطأ / Error: {e}")
-                errors += 1
-            
-            print("-" * 60)
+        if self.max_workers > 1:
+            print(f"⚡ معالجة متزامنة / Concurrent workers: {self.max_workers}\n")
+        
+        paths = [os.path.join(self.input_folder, filename) for filename in images]
+        results = self._recognize_in_order(paths)
+        
+        try:
+            with self.db_manager.batch():
+                for i, (filename, full_path, get_result) in enumerate(zip(images, paths, results), 1):
+                    print(f"[{i}/{len(images)}] معالجة / Processing: {filename}")
+                    
+                    try:
+                        result = get_result()
+                        self.handle_result(result, full_path)
+                        processed += 1
+                    except Exception as e:
+                        print(f"❌ فشلت معالجة الصورة / Failed to process: {filename}")
+                        print(f"   الخطأ / Error: {e}")
+                        errors += 1
+                    
+                    print("-" * 60)
+        except ViolationWriteError as e:
+            print(f"❌ تعذرت كتابة {len(e.rows)} مخالفة مؤجلة في قاعدة البيانات")
+            print(f"❌ Failed to write {len(e.rows)} queued violation(s) to the database")
+            for row in e.rows:
+                print(f"   - {row[1]} @ {row[3]}")
+            unsaved_violations = len(e.rows)
         
-        # ملخص النتائج
+        # ملخص النتائج (المخالفات غير المحفوظة تُعرض منفصلة لأن صورها عولجت بالفعل)
         print_summary(processed, errors, len(images))
+        if unsaved_violations:
+            print(f"⚠️ مخالفات لم تُحفظ / Unsaved violations: {unsaved_violations}")
+        cache_stats = self.db_manager.cache_stats()
+        if cache_stats:
+            print(f"🗂️ ذاكرة البحث / Lookup cache: {cache_stats['hits']} hits, "
+                  f"{cache_stats['misses']} misses ({cache_stats['hit_rate']}%)")
         print(f"📁 الصور المحفوظة في / Images saved in: {os.path.abspath(self.output_folder)}")
     
+    def _recognize_in_order(self, paths):
+        """
+        إرسال الصور إلى API وإرجاع النتائج بنفس ترتيب الإدخال
+        Send images to the API and yield result getters in input order
+        
+        يبقى عدد الطلبات المعلقة محدوداً بضعف عدد العمال
+        The number of in-flight requests is bounded to twice the worker count
+        """
+        if self.max_workers <= 1:
+            for path in paths:
+                yield partial(self.api.process_image, path)
+            return
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            for path in paths:
+                pending.append(executor.submit(self.api.process_image, path))
+                if len(pending) >= self.max_workers * 2:
+                    yield pending.popleft().result
+            while pending:
+                yield pending.popleft().result
+    
     def close(self):
-        """إغلاق الاتصال بقاعدة البيانات"""
+        """إغلاق الاتصال بقاعدة البيانات وجلسة API"""
+        self.api.close()
         self.db_manager.close()
 
 def main():
@@ -18,10 +18,531 @@ Main Objectives:
 import os
 import sys
 import json
+import math
+import threading
 import requests
-from datetime import datetime
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
 import time
+import argparse
+from collections import Counter, deque
+from urllib.parse import urlencode
+
+try:
+    import pandas as pd
+    PANDAS_AVAILABLE = True
+except ImportError:
+    PANDAS_AVAILABLE = False
+
+
+DEFAULT_SYNC_STATE_FILE = 'data/parkpow_sync_state.json'
+
+
+class RateLimiter:
+    """
+    محدد معدل الطلبات (Token Bucket) مشترك بين الخيوط
+    Thread-safe token-bucket rate limiter shared by all page fetchers
+    """
+    
+    def __init__(self, requests_per_second: float):
+        """
+        Args:
+            requests_per_second: عدد الطلبات المسموح بها في الثانية (0 = بدون حد)
+        """
+        self.rate = requests_per_second
+        self.capacity = max(1.0, requests_per_second)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """
+        انتظر حتى يُسمح بإرسال طلب
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if not self.rate or self.rate <= 0:
+                        return
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+    
+    def pause(self, seconds: float):
+        """
+        إيقاف جميع الطلبات مؤقتاً (مثلاً عند استلام 429 مع Retry-After)
+        Block every caller for the given number of seconds
+        """
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class StreamingJSONWriter:
+    """
+    كاتب JSON تدفقي: يكتب الكائن الخارجي حقلاً بعد حقل والمصفوفات عنصراً بعد عنصر
+    Streaming JSON writer: emits the outer object field by field and arrays item by item,
+    so large lists never have to be held in memory as one document
+    
+    يُكتب إلى ملف مؤقت ثم يُستبدل الملف النهائي عند النجاح فقط
+    Output goes to a temporary file that replaces the target only on success
+    """
+    
+    def __init__(self, filename: str, indent: int = 2):
+        self.filename = filename
+        self.indent = indent
+        self._tmp = f'{filename}.tmp'
+        self._file = None
+        self._fields = 0
+    
+    def __enter__(self):
+        directory = os.path.dirname(self.filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self._tmp, 'w', encoding='utf-8')
+        self._file.write('{')
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._file.write('\n}\n')
+        finally:
+            self._file.close()
+        if exc_type is None:
+            os.replace(self._tmp, self.filename)
+        else:
+            os.remove(self._tmp)
+        return False
+    
+    def _dumps(self, value, depth: int) -> str:
+        text = json.dumps(value, ensure_ascii=False, indent=self.indent, default=_json_default)
+        return text.replace('\n', '\n' + ' ' * (self.indent * depth))
+    
+    def _key(self, key: str):
+        self._file.write(',' if self._fields else '')
+        self._file.write(f"\n{' ' * self.indent}{json.dumps(key, ensure_ascii=False)}: ")
+        self._fields += 1
+    
+    def write_field(self, key: str, value):
+        """
+        كتابة حقل واحد (قيمة صغيرة مثل metadata أو statistics)
+        """
+        self._key(key)
+        self._file.write(self._dumps(value, 1))
+    
+    def write_array(self, key: str, items: Iterable) -> int:
+        """
+        كتابة مصفوفة من أي iterable (قائمة أو مولّد) دون تجميعها في الذاكرة
+        Write an array from any iterable (list or generator) without materializing it
+        
+        Returns:
+            عدد العناصر المكتوبة
+        """
+        self._key(key)
+        self._file.write('[')
+        count = 0
+        pad = ' ' * (self.indent * 2)
+        for item in items:
+            self._file.write(',' if count else '')
+            self._file.write(f'\n{pad}{self._dumps(item, 2)}')
+            count += 1
+        if count:
+            self._file.write(f"\n{' ' * self.indent}")
+        self._file.write(']')
+        return count
+
+
+class StatisticsAccumulator:
+    """
+    مجمّع إحصائيات تدفقي: يحدّث جميع العدادات والقيم المميزة والمتوسطات في مرور واحد
+    Streaming statistics accumulator: updates every counter, distinct set, mean and group
+    count in a single pass, and can merge partial results from parallel workers
+    
+    تُعرّف الحقول في الفئات الفرعية كسمات فئة، لذا تبقى الكائنات قابلة للـ pickle
+    Fields are declared as class attributes in subclasses, so instances stay picklable
+    
+    - COUNTERS: اسم -> دالة شرط (عدد السجلات التي تحققه)
+    - DISTINCT: اسم -> دالة مفتاح (القيم المميزة بترتيب الظهور)
+    - MEANS: اسم -> دالة قيمة (المجموع لحساب المتوسط)
+    - GROUPS: اسم -> دالة مفتاح (عدد السجلات لكل مفتاح)
+    """
+    
+    COUNTERS = {}
+    DISTINCT = {}
+    MEANS = {}
+    GROUPS = {}
+    
+    def __init__(self, records: Iterable[Dict] = ()):
+        self.total = 0
+        self.counts = dict.fromkeys(self.COUNTERS, 0)
+        self.distinct = {name: {} for name in self.DISTINCT}
+        self.sums = dict.fromkeys(self.MEANS, 0.0)
+        self.groups = {name: Counter() for name in self.GROUPS}
+        for record in records:
+            self.add(record)
+    
+    def add(self, record: Dict):
+        """
+        إضافة سجل واحد
+        """
+        self.total += 1
+        for name, predicate in self.COUNTERS.items():
+            if predicate(record):
+                self.counts[name] += 1
+        for name, key in self.DISTINCT.items():
+            self.distinct[name][key(record)] = None
+        for name, value in self.MEANS.items():
+            self.sums[name] += value(record) or 0
+        for name, key in self.GROUPS.items():
+            self.groups[name][key(record)] += 1
+    
+    def track(self, records: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        تمرير السجلات كما هي مع تحديث الإحصائيات (للاستخدام أثناء الكتابة التدفقية)
+        Pass records through unchanged while accumulating (for use while streaming)
+        """
+        for record in records:
+            self.add(record)
+            yield record
+    
+    def merge(self, other: 'StatisticsAccumulator') -> 'StatisticsAccumulator':
+        """
+        دمج نتائج جزئية من عامل آخر من نفس النوع
+        Merge partial results from another worker of the same type
+        """
+        if type(other) is not type(self):
+            raise TypeError(f"Cannot merge {type(other).__name__} into {type(self).__name__}")
+        self.total += other.total
+        for name, count in other.counts.items():
+            self.counts[name] += count
+        for name, values in other.distinct.items():
+            self.distinct[name].update(values)
+        for name, value in other.sums.items():
+            self.sums[name] += value
+        for name, counter in other.groups.items():
+            self.groups[name].update(counter)
+        return self
+    
+    def mean(self, name: str, digits: int = 2) -> float:
+        """
+        المتوسط لحقل من MEANS
+        """
+        return round(self.sums[name] / self.total, digits) if self.total else 0
+    
+    def ratio(self, name: str) -> float:
+        """
+        نسبة السجلات التي تحقق شرط العداد
+        """
+        return self.counts[name] / self.total if self.total else 0
+
+
+class VehicleStatistics(StatisticsAccumulator):
+    """
+    إحصائيات قاعدة بيانات السيارات (حقل statistics في parkpow_vehicles.json)
+    Vehicle database statistics
+    """
+    
+    COUNTERS = {
+        'vehicles_with_type': lambda v: bool(v.get('vehicleType') and v['vehicleType'] != 'غير محدد'),
+        'vehicles_with_color': lambda v: bool(v.get('color') and v['color'] != 'غير محدد'),
+        'vehicles_with_make': lambda v: bool(v.get('make')),
+        'vehicles_with_model': lambda v: bool(v.get('model')),
+        'vehicles_with_location': lambda v: bool(v.get('latitude') and v.get('longitude')),
+        'reviewed_vehicles': lambda v: bool(v.get('reviewed')),
+    }
+    DISTINCT = {
+        'regions': lambda v: v.get('region', 'unknown'),
+        'vehicle_types': lambda v: v.get('vehicleType', 'unknown'),
+        'colors': lambda v: v.get('color', 'unknown'),
+    }
+    MEANS = {
+        'avg_confidence': lambda v: v.get('confidence', 0),
+    }
+    
+    # الحقول التي تدخل في نسبة الاكتمال (20% لكل منها)
+    COMPLETENESS_FIELDS = ('vehicles_with_type', 'vehicles_with_color', 'vehicles_with_make',
+                           'vehicles_with_model', 'vehicles_with_location')
+    
+    @property
+    def completeness(self) -> float:
+        """
+        نسبة اكتمال البيانات (0-100)
+        """
+        return sum(self.ratio(name) * 20 for name in self.COMPLETENESS_FIELDS)
+    
+    def to_dict(self) -> Dict:
+        stats = {'total_vehicles': self.total}
+        stats.update(self.counts)
+        stats['avg_confidence'] = self.mean('avg_confidence')
+        for name, values in self.distinct.items():
+            stats[name] = list(values)
+        return stats
+
+
+class ViolationStatistics(StatisticsAccumulator):
+    """
+    إحصائيات المخالفات (حقل statistics في parkpow_violations.json)
+    Violation statistics
+    """
+    
+    GROUPS = {
+        'plates': lambda v: v.get('plateNumber'),
+    }
+    
+    def plate_counts(self) -> Counter:
+        """
+        عدد المخالفات لكل لوحة
+        """
+        return self.groups['plates']
+    
+    def to_dict(self) -> Dict:
+        plates = self.groups['plates']
+        return {
+            'total_violations': self.total,
+            'unique_vehicles': len(plates),
+            'repeat_offenders_count': sum(1 for count in plates.values() if count > 1),
+            'average_violations_per_vehicle': round(self.total / len(plates), 2) if plates else 0
+        }
+
+class SlotRecord:
+    """
+    أساس السجلات المضغوطة: حقول ثابتة في __slots__ بدلاً من قاموس لكل سجل، مع توحيد
+    (intern) النصوص المتكررة مثل اللون والنوع والمنطقة والكاميرا
+    Base for compact records: fixed __slots__ fields instead of a per-record dict, with
+    repeated strings (color, type, region, camera...) interned so they are stored once
+    
+    يدعم get() و [] مثل القاموس حتى يعمل مع الكود الحالي، و to_dict() للحفظ
+    Supports dict-style get() and [] for existing callers, and to_dict() for serialization
+    """
+    
+    __slots__ = ()
+    FIELDS = ()
+    INTERNED = frozenset()
+    
+    def __init__(self, **fields):
+        for name in self.FIELDS:
+            value = fields.get(name)
+            if name in self.INTERNED and isinstance(value, str):
+                value = sys.intern(value)
+            setattr(self, name, value)
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SlotRecord':
+        return cls(**data)
+    
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+    
+    def __getitem__(self, key: str):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+
+class VehicleRecord(SlotRecord):
+    """
+    سجل سيارة واحد (عنصر في vehicles)
+    A single vehicle record (one entry of 'vehicles')
+    """
+    
+    FIELDS = ('id', 'plateNumber', 'plateUnicode', 'vehicleType', 'color', 'make', 'model', 'year',
+              'region', 'regionName', 'country', 'latitude', 'longitude', 'confidence',
+              'timestamp', 'capturedAt', 'source', 'cameraId', 'imageUrl', 'direction', 'speed',
+              'reviewed', 'reviewedBy', 'reviewStatus', 'status', 'rawData')
+    __slots__ = FIELDS
+    INTERNED = frozenset(('vehicleType', 'color', 'make', 'model', 'region', 'regionName', 'country',
+                          'source', 'cameraId', 'direction', 'reviewedBy', 'reviewStatus', 'status'))
+
+
+class ViolationRecord(SlotRecord):
+    """
+    سجل مخالفة واحد؛ حقول الموقع تُحفظ مسطحة وتُجمع في location عند الحفظ
+    A single violation record; location fields are stored flat and nested on serialization
+    """
+    
+    LOCATION_FIELDS = ('latitude', 'longitude', 'region', 'cameraId')
+    FIELDS = ('id', 'plateNumber', 'vehicleType', 'color', 'violationType', 'violationDate',
+              'confidence', 'imageUrl', 'status', 'reviewed', 'notes') + LOCATION_FIELDS
+    __slots__ = FIELDS
+    INTERNED = frozenset(('vehicleType', 'color', 'violationType', 'region', 'cameraId',
+                          'status', 'notes'))
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ViolationRecord':
+        fields = dict(data)
+        fields.update(fields.pop('location', None) or {})
+        return cls(**fields)
+    
+    def to_dict(self) -> Dict:
+        data = {}
+        for name in self.FIELDS:
+            if name in self.LOCATION_FIELDS:
+                continue
+            if name == 'confidence':
+                data['location'] = {field: getattr(self, field) for field in self.LOCATION_FIELDS}
+            data[name] = getattr(self, name)
+        return data
+
+
+class RepeatOffenderEngine:
+    """
+    محرك تحديد المخالفين المتكررين على جدول الرصد
+    Repeat-offender engine over the detection table
+    
+    يبني جدولاً عمودياً (pandas) من السجلات ويحسب لكل لوحة في مرور groupby واحد: العدد،
+    أول/آخر ظهور، توزيع الكاميرات ومستوى الخطورة، مع دعم النافذة الزمنية
+    ("3 مرات أو أكثر خلال 7 أيام"). بدون pandas يُستخدم مسار Python بنفس النتائج.
+    Builds a columnar (pandas) table from the records and computes, per plate and in one
+    groupby pass, the count, first/last sighting, camera distribution and risk level, with
+    optional time-windowed detection ("3+ sightings in 7 days"). Without pandas a pure
+    Python path produces the same result.
+    """
+    
+    # حدود مستوى الخطورة (المصدر الوحيد): 1-2 منخفض، 3-4 متوسط، 5+ مرتفع
+    RISK_BINS = (0, 2, 4, float('inf'))
+    RISK_LABELS = ('low', 'medium', 'high')
+    
+    @classmethod
+    def risk_level(cls, count: int) -> str:
+        """
+        مستوى الخطورة لعدد مخالفات (نفس فترات pd.cut على RISK_BINS: (a, b])
+        """
+        for upper, label in zip(cls.RISK_BINS[1:], cls.RISK_LABELS):
+            if count <= upper:
+                return label
+        return cls.RISK_LABELS[-1]
+    
+    def __init__(self, records: List[Dict], plate_field: str = 'plateNumber',
+                 time_field: str = 'violationDate', camera_field: str = 'cameraId'):
+        self.records = records
+        self.plates = [r.get(plate_field) for r in records]
+        self.times = [r.get(time_field) for r in records]
+        self.cameras = [r.get(camera_field) or '' for r in records]
+    
+    def offenders(self, min_count: int = 2, window_days: Optional[float] = None) -> List[Dict]:
+        """
+        المخالفون المتكررون مرتبين حسب العدد (الأكثر أولاً)
+        Repeat offenders sorted by count (most first)
+        
+        Args:
+            min_count: أقل عدد ظهور ليُعتبر مخالفاً متكرراً
+            window_days: إذا حُدد يجب أن يقع min_count ظهوراً داخل نافذة بهذا العدد من الأيام
+            
+        Returns:
+            لكل لوحة: plate, count, positions (مواقع السجلات مرتبة زمنياً), cameras, riskLevel
+        """
+        if PANDAS_AVAILABLE:
+            return self._offenders_pandas(min_count, window_days)
+        return self._offenders_python(min_count, window_days)
+    
+    def _offenders_pandas(self, min_count: int, window_days: Optional[float]) -> List[Dict]:
+        # اللوحات والكاميرات كرموز صحيحة (factorize) لتسريع الترتيب والتجميع
+        # Plates and cameras as integer codes (factorize) for fast sorting and grouping
+        plate_codes, plates = pd.factorize(pd.Series(self.plates, dtype=object))
+        camera_codes, cameras = pd.factorize(pd.Series(self.cameras, dtype=object))
+        frame = pd.DataFrame({
+            'plate': plate_codes,
+            'time': pd.to_datetime(pd.Series(self.times, dtype=object), utc=True,
+                                   errors='coerce', format='ISO8601'),
+            'camera': camera_codes,
+            'pos': range(len(plate_codes)),
+        })
+        # ترتيب زمني داخل كل لوحة (القيم غير الصالحة في النهاية)
+        frame = frame.sort_values(['plate', 'time', 'pos'], kind='stable', na_position='last')
+        
+        grouped = frame.groupby('plate', sort=False)
+        summary = grouped.agg(count=('pos', 'size'), order=('pos', 'min'))
+        summary['riskLevel'] = pd.cut(summary['count'], bins=self.RISK_BINS,
+                                      labels=self.RISK_LABELS).astype(str)
+        
+        eligible = summary['count'] >= min_count
+        if window_days is not None and min_count > 1:
+            # ظهور i والظهور i+(min_count-1) لنفس اللوحة داخل النافذة
+            # Sighting i and sighting i+(min_count-1) of the same plate fall within the window
+            timed = frame.dropna(subset=['time'])
+            ahead = min_count - 1
+            hit = ((timed['plate'].shift(-ahead) == timed['plate']) &
+                   (timed['time'].shift(-ahead) - timed['time'] <= pd.Timedelta(days=window_days)))
+            eligible &= summary.index.isin(timed.loc[hit, 'plate'].unique())
+        
+        summary = summary[eligible].sort_values(['count', 'order'], ascending=[False, True], kind='stable')
+        
+        selected = frame[frame['plate'].isin(summary.index)]
+        camera_counts = selected.groupby(['plate', 'camera'], sort=False).size()
+        camera_map = {}
+        for (plate, camera), count in camera_counts.items():
+            camera_map.setdefault(plate, {})[cameras[camera]] = int(count)
+        
+        # مواقع السجلات لكل لوحة بالترتيب الزمني
+        # Record positions per plate, in time order
+        positions = selected.groupby('plate', sort=False).indices
+        pos_values = selected['pos'].to_numpy()
+        
+        return [
+            {
+                'plate': plates[code],
+                'count': int(count),
+                'positions': pos_values[positions[code]].tolist(),
+                'cameras': camera_map.get(code, {}),
+                'riskLevel': level,
+            }
+            for code, count, level in zip(summary.index, summary['count'], summary['riskLevel'])
+        ]
+    
+    def _offenders_python(self, min_count: int, window_days: Optional[float]) -> List[Dict]:
+        groups = {}
+        for pos, plate in enumerate(self.plates):
+            groups.setdefault(plate, []).append(pos)
+        
+        def sort_key(pos):
+            parsed = ParkPowVehicleFetcher._item_timestamp({'timestamp': self.times[pos]})
+            return (parsed is None, parsed or datetime.min.replace(tzinfo=timezone.utc), pos)
+        
+        result = []
+        for plate, positions in groups.items():
+            if len(positions) < min_count:
+                continue
+            keyed = sorted(sort_key(pos) for pos in positions)
+            positions = [pos for _, _, pos in keyed]
+            if window_days is not None and min_count > 1:
+                times = [parsed for missing, parsed, _ in keyed if not missing]
+                span = min_count - 1
+                if not any((times[i + span] - times[i]).total_seconds() <= window_days * 86400
+                           for i in range(len(times) - span)):
+                    continue
+            cameras = {}
+            for pos in positions:
+                cameras[self.cameras[pos]] = cameras.get(self.cameras[pos], 0) + 1
+            count = len(positions)
+            level = self.risk_level(count)
+            result.append({'plate': plate, 'count': count, 'positions': positions,
+                           'cameras': cameras, 'riskLevel': level})
+        
+        result.sort(key=lambda o: o['count'], reverse=True)
+        return result
+
+
+def _json_default(obj):
+    """
+    تحويل السجلات المضغوطة إلى قواميس أثناء كتابة JSON
+    """
+    if isinstance(obj, SlotRecord):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
 
 class ParkPowVehicleFetcher:
     """
@@ -29,7 +550,11 @@ class ParkPowVehicleFetcher:
     Class for fetching vehicle data from ParkPow API
     """
     
-    def __init__(self, api_token: str = None, api_url: str = None):
+    # عدد العناصر المطلوب في كل صفحة
+    PAGE_SIZE = 100
+    
+    def __init__(self, api_token: str = None, api_url: str = None,
+                 max_workers: int = None, requests_per_second: float = None):
         """
         تهيئة الفئة
         Initialize the class
@@ -37,9 +562,23 @@ class ParkPowVehicleFetcher:
         Args:
             api_token: رمز API من ParkPow (يمكن تعيينه عبر PARKPOW_API_TOKEN)
             api_url: رابط API (افتراضي: https://app.parkpow.com/api/v1)
+            max_workers: عدد الصفحات التي تُجلب بالتوازي (PARKPOW_MAX_WORKERS، افتراضي: 4)
+            requests_per_second: الحد الأقصى للطلبات في الثانية (PARKPOW_RATE_LIMIT، افتراضي: 2)
         """
         self.api_token = api_token or os.getenv('PARKPOW_API_TOKEN')
         self.api_url = api_url or os.getenv('PARKPOW_API_URL', 'https://app.parkpow.com/api/v1')
+        self.max_workers = max(1, int(max_workers or os.getenv('PARKPOW_MAX_WORKERS', 4)))
+        if requests_per_second is None:
+            requests_per_second = float(os.getenv('PARKPOW_RATE_LIMIT', 2.0))
+        self.rate_limiter = RateLimiter(requests_per_second)
+        
+        # الـ endpoint الذي أعاد بيانات يُحفظ ويُستخدم لبقية الصفحات
+        # The endpoint that returned data is cached for the rest of the session
+        self._endpoint_index = None
+        
+        # معاملات إضافية تُرسل مع كل طلب صفحة (مثل فلتر التاريخ في المزامنة التزايدية)
+        # Extra query parameters sent with every page request (e.g. the incremental sync filter)
+        self.extra_params = {}
         
         if not self.api_token:
             raise ValueError(
@@ -57,7 +596,73 @@ class ParkPowVehicleFetcher:
         
         self.session = requests.Session()
         self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+    
+    def _get(self, url: str, max_retries: int = 3) -> requests.Response:
+        """
+        طلب GET عبر محدد المعدل مع احترام Retry-After عند استلام 429
+        Rate-limited GET that honours Retry-After on 429 responses
+        """
+        for attempt in range(max_retries + 1):
+            self.rate_limiter.acquire()
+            response = self.session.get(url, timeout=30)
+            if response.status_code != 429 or attempt == max_retries:
+                return response
+            
+            wait = self._retry_after_seconds(response, default=2 ** attempt)
+            print(f"⏳ تم تجاوز حد الطلبات (429)، الانتظار {wait:.0f} ثانية...")
+            print(f"⏳ Rate limited (429), waiting {wait:.0f}s before retrying...")
+            self.rate_limiter.pause(wait)
+        return response
+    
+    @staticmethod
+    def _retry_after_seconds(response: requests.Response, default: float) -> float:
+        """
+        قراءة Retry-After (ثوانٍ أو تاريخ HTTP)
+        """
+        value = response.headers.get('Retry-After')
+        if not value:
+            return default
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+            return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return default
+    
+    @staticmethod
+    def _extract_results(data) -> List[Dict]:
+        """
+        استخراج العناصر من بنى الاستجابة المختلفة
+        Extract items from the different possible response structures
+        """
+        if isinstance(data, list):
+            return data
+        if 'results' in data:
+            return data['results']
+        if 'data' in data:
+            return data['data']
+        # If the response is a dict with vehicle data directly
+        return [data]
+    
+    @classmethod
+    def _has_next(cls, data, page_size: int = None) -> bool:
+        """
+        هل توجد صفحات إضافية؟
         
+        إذا لم يحتوِ الرد على next/has_next (مثل الردود بصيغة قائمة) تُعتبر الصفحة
+        الممتلئة دليلاً على وجود صفحة تالية، ويتوقف الجلب عند صفحة ناقصة أو فارغة
+        Without next/has_next (e.g. plain-list responses) a full page means there may be more
+        """
+        if isinstance(data, dict) and ('next' in data or 'has_next' in data):
+            return data.get('next') is not None or bool(data.get('has_next', False))
+        return len(cls._extract_results(data)) >= (page_size or cls.PAGE_SIZE)
+
     def test_connection(self) -> bool:
         """
         اختبار الاتصال بـ API
@@ -70,7 +675,7 @@ class ParkPowVehicleFetcher:
             print("🔄 اختبار الاتصال بـ ParkPow API...")
             print("🔄 Testing connection to ParkPow API...")
             
-            response = self.session.get(f'{self.api_url}/user/')
+            response = self._get(f'{self.api_url}/user/')
             
             if response.status_code == 200:
                 user_data = response.json()
@@ -90,7 +695,7 @@ class ParkPowVehicleFetcher:
             print(f"❌ Connection error: {str(e)}")
             return False
     
-    def fetch_reviews(self, page: int = 1, page_size: int = 100) -> Optional[Dict]:
+    def fetch_reviews(self, page: int = 1, page_size: int = PAGE_SIZE) -> Optional[Dict]:
         """
         جلب بيانات المراجعات/السيارات من صفحة محددة
         Fetch review/vehicle data from a specific page
@@ -105,22 +710,29 @@ class ParkPowVehicleFetcher:
         try:
             # محاولة endpoints مختلفة بالترتيب الأنسب
             # Try different endpoints in optimal order for complete data
+            query = f'&{urlencode(self.extra_params)}' if self.extra_params else ''
             endpoints = [
                 # Review endpoint (الأساسي للمراجعات الكاملة)
-                f'{self.api_url}/review/?page={page}&page_size={page_size}',
+                f'{self.api_url}/review/?page={page}&page_size={page_size}{query}',
                 # Plate reader results (نتائج التعرف على اللوحات)
-                f'{self.api_url}/plate-reader/?page={page}&page_size={page_size}',
+                f'{self.api_url}/plate-reader/?page={page}&page_size={page_size}{query}',
                 # Results with full details (النتائج الكاملة)
-                f'{self.api_url}/results/?page={page}&page_size={page_size}',
+                f'{self.api_url}/results/?page={page}&page_size={page_size}{query}',
                 # Vehicles endpoint (معلومات السيارات)
-                f'{self.api_url}/vehicles/?page={page}&page_size={page_size}',
+                f'{self.api_url}/vehicles/?page={page}&page_size={page_size}{query}',
             ]
             
-            for endpoint in endpoints:
+            # بعد اكتشاف الـ endpoint الصحيح لا داعي لتجربة البقية في كل صفحة
+            # Once the working endpoint is known, skip probing the others
+            candidates = list(enumerate(endpoints))
+            if self._endpoint_index is not None:
+                candidates = [candidates[self._endpoint_index]]
+            
+            for index, endpoint in candidates:
                 print(f"🔄 محاولة جلب البيانات من: {endpoint}")
                 print(f"🔄 Attempting to fetch data from: {endpoint}")
                 
-                response = self.session.get(endpoint)
+                response = self._get(endpoint)
                 
                 if response.status_code == 200:
                     data = response.json()
@@ -136,6 +748,7 @@ class ParkPowVehicleFetcher:
                         has_data = True
                     
                     if has_data:
+                        self._endpoint_index = index
                         print(f"✅ تم جلب البيانات بنجاح من الصفحة {page}")
                         print(f"✅ Data fetched successfully from page {page}")
                         print(f"📦 عدد العناصر المستلمة: {len(data.get('results', data.get('data', data)))}")
@@ -162,72 +775,241 @@ class ParkPowVehicleFetcher:
             print(traceback.format_exc())
             return None
     
-    def fetch_all_reviews(self, max_pages: int = 10, delay: float = 1.0) -> List[Dict]:
+    def fetch_all_reviews(self, max_pages: int = 10, delay: float = 1.0,
+                          start_page: int = 1, workers: int = None) -> List[Dict]:
         """
         جلب جميع المراجعات/السيارات من صفحات متعددة
         Fetch all reviews/vehicles from multiple pages
         
         Args:
             max_pages: الحد الأقصى لعدد الصفحات
-            delay: التأخير بين الطلبات (بالثواني)
+            delay: التأخير بين الطلبات (بالثواني) في الوضع التسلسلي
+            start_page: رقم أول صفحة
+            workers: عدد الصفحات المجلوبة بالتوازي (افتراضي: max_workers)؛
+                     في الوضع المتوازي يضبط محدد المعدل سرعة الطلبات بدلاً من delay
             
         Returns:
             قائمة بجميع العناصر
         """
+        workers = workers or self.max_workers
+        last_page = start_page + max_pages - 1
         all_items = []
-        page = 1
+        page = start_page
         
         print(f"\n📊 بدء جلب البيانات من {max_pages} صفحات كحد أقصى...")
         print(f"📊 Starting to fetch data from up to {max_pages} pages...\n")
         
-        while page <= max_pages:
-            data = self.fetch_reviews(page=page)
-            
-            if not data:
-                print(f"⚠️  لا توجد بيانات في الصفحة {page}")
-                break
-            
-            # Extract results from different possible response structures
-            results = []
-            if 'results' in data:
-                results = data['results']
-            elif 'data' in data:
-                results = data['data']
-            elif isinstance(data, list):
-                results = data
-            else:
-                # If the response is a dict with vehicle data directly
-                results = [data]
-            
-            if not results:
-                print(f"⚠️  لا توجد نتائج في الصفحة {page}")
-                break
-            
-            all_items.extend(results)
-            print(f"📦 تم جلب {len(results)} عنصر من الصفحة {page} (المجموع: {len(all_items)})")
-            print(f"📦 Fetched {len(results)} items from page {page} (Total: {len(all_items)})")
-            
-            # Check if there are more pages
-            has_next = False
-            if isinstance(data, dict):
-                has_next = data.get('next') is not None or data.get('has_next', False)
-            
-            if not has_next:
-                print(f"ℹ️  لا توجد صفحات إضافية")
-                break
-            
-            page += 1
+        # الصفحة الأولى تُجلب وحدها لاكتشاف الـ endpoint وعدد النتائج
+        # The first page is fetched alone to discover the endpoint and total count
+        data = self.fetch_reviews(page=page)
+        more = self._add_page(all_items, page, data)
+        
+        if more and workers > 1:
+            count = data.get('count') if isinstance(data, dict) else None
+            page_size = len(self._extract_results(data))
+            if isinstance(count, int) and page_size:
+                last_page = min(last_page, math.ceil(count / page_size))
             
-            # Add delay to avoid rate limiting
-            if page <= max_pages:
+            print(f"⚡ جلب متوازٍ / Parallel fetch: {workers} workers\n")
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                while more and page < last_page:
+                    batch = list(range(page + 1, min(page + workers, last_page) + 1))
+                    for page, data in zip(batch, executor.map(self.fetch_reviews, batch)):
+                        more = self._add_page(all_items, page, data)
+                        if not more:
+                            break
+        else:
+            while more and page < last_page:
+                # Add delay to avoid rate limiting
                 time.sleep(delay)
+                page += 1
+                data = self.fetch_reviews(page=page)
+                more = self._add_page(all_items, page, data)
         
-        print(f"\n✅ تم جلب إجمالي {len(all_items)} عنصر من {page-1} صفحة")
-        print(f"✅ Total of {len(all_items)} items fetched from {page-1} pages\n")
+        pages_fetched = page - start_page + 1
+        print(f"\n✅ تم جلب إجمالي {len(all_items)} عنصر من {pages_fetched} صفحة")
+        print(f"✅ Total of {len(all_items)} items fetched from {pages_fetched} pages\n")
         
         return all_items
     
-    def transform_to_vehicle_format(self, items: List[Dict]) -> List[Dict]:
+    def _add_page(self, all_items: List[Dict], page: int, data) -> bool:
+        """
+        إضافة عناصر صفحة إلى القائمة. يرجع True إذا كانت هناك صفحات إضافية
+        """
+        if not data:
+            print(f"⚠️  لا توجد بيانات في الصفحة {page}")
+            return False
+        
+        results = self._extract_results(data)
+        if not results:
+            print(f"⚠️  لا توجد نتائج في الصفحة {page}")
+            return False
+        
+        all_items.extend(results)
+        print(f"📦 تم جلب {len(results)} عنصر من الصفحة {page} (المجموع: {len(all_items)})")
+        print(f"📦 Fetched {len(results)} items from page {page} (Total: {len(all_items)})")
+        
+        if not self._has_next(data):
+            print(f"ℹ️  لا توجد صفحات إضافية")
+            return False
+        return True
+    
+    @staticmethod
+    def _item_timestamp(item: Dict) -> Optional[datetime]:
+        """
+        استخراج وقت العنصر كـ datetime (بتوقيت UTC إن لم تُحدد المنطقة)
+        """
+        value = item.get('timestamp', item.get('created', item.get('datetime', '')))
+        if not value:
+            return None
+        try:
+            parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed
+    
+    @staticmethod
+    def _id_key(value) -> Tuple:
+        """
+        مفتاح مقارنة للمعرف (الأرقام رقمياً وغيرها نصياً) لفك التعادل في الوقت
+        """
+        if value is None:
+            return (0, 0, '')
+        try:
+            return (1, int(value), '')
+        except (TypeError, ValueError):
+            return (2, 0, str(value))
+    
+    def _sync_key(self, item: Dict) -> Optional[Tuple]:
+        """
+        مفتاح ترتيب المزامنة (الوقت، المعرف) أو None إذا لم يكن للعنصر وقت
+        """
+        item_dt = self._item_timestamp(item)
+        if item_dt is None:
+            return None
+        return item_dt, self._id_key(item.get('id', item.get('uuid')))
+    
+    def fetch_new_reviews(self, since: str, max_pages: int = 10,
+                          since_param: str = None, since_id=None,
+                          ordering: str = None) -> List[Dict]:
+        """
+        جلب العناصر الأحدث من علامة المزامنة السابقة فقط
+        Fetch only items newer than the previous high-water mark
+        
+        يُطلب الترتيب من الأحدث صراحةً (ordering)، وإذا حُدد since_param يُرسل كفلتر إلى الخادم.
+        يُقارن كل عنصر بالعلامة (الوقت، المعرف) فلا تضيع العناصر التي تشارك آخر وقت،
+        ويتوقف الجلب بعد أول صفحة مرتبة تنازلياً تحتوي عناصر أقدم من وقت العلامة
+        Newest-first order is requested explicitly and items are compared to the (timestamp, id)
+        mark, so items sharing the mark's timestamp are kept. Paging stops after the first
+        newest-first page that reaches items older than the mark; if the server ignores the
+        ordering and returns oldest-first pages, every page up to max_pages is scanned
+        
+        Args:
+            since: وقت آخر عنصر تمت مزامنته (ISO 8601)
+            max_pages: الحد الأقصى لعدد الصفحات
+            since_param: اسم معامل الفلتر في API (PARKPOW_SINCE_PARAM)
+            since_id: معرف آخر عنصر تمت مزامنته (last_id في حالة المزامنة)
+            ordering: قيمة معامل ordering (PARKPOW_ORDERING، افتراضي: -timestamp)
+        """
+        since_dt = self._item_timestamp({'timestamp': since})
+        mark = (since_dt, self._id_key(since_id)) if since_dt else None
+        if ordering is None:
+            ordering = os.getenv('PARKPOW_ORDERING', '-timestamp')
+        if ordering:
+            self.extra_params['ordering'] = ordering
+        if since_param:
+            self.extra_params[since_param] = since
+        
+        new_items = []
+        try:
+            for page in range(1, max_pages + 1):
+                data = self.fetch_reviews(page=page)
+                if not data:
+                    break
+                results = self._extract_results(data)
+                
+                reached_older = False
+                keys = []
+                for item in results:
+                    key = self._sync_key(item)
+                    if key is not None:
+                        keys.append(key)
+                    if mark and key is not None and key <= mark:
+                        reached_older = reached_older or key[0] < since_dt
+                        continue
+                    new_items.append(item)
+                
+                newest_first = len(keys) < 2 or keys[0] >= keys[-1]
+                if (reached_older and newest_first) or not results or not self._has_next(data):
+                    break
+        finally:
+            self.extra_params.pop('ordering', None)
+            self.extra_params.pop(since_param, None)
+        
+        print(f"✅ عناصر جديدة منذ {since}: {len(new_items)}")
+        print(f"✅ New items since {since}: {len(new_items)}")
+        return new_items
+    
+    def high_water_mark(self, items: List[Dict], state: Dict = None) -> Dict:
+        """
+        حساب علامة المزامنة الجديدة (أحدث وقت ومعرفه) من العناصر والحالة السابقة
+        """
+        state = dict(state or {})
+        latest = self._sync_key({'timestamp': state.get('last_timestamp'), 'id': state.get('last_id')})
+        for item in items:
+            key = self._sync_key(item)
+            if key is not None and (latest is None or key > latest):
+                latest = key
+                state['last_timestamp'] = key[0].isoformat()
+                state['last_id'] = item.get('id', item.get('uuid'))
+        state['synced_at'] = datetime.now().isoformat()
+        return state
+    
+    @staticmethod
+    def load_sync_state(filename: str = DEFAULT_SYNC_STATE_FILE) -> Optional[Dict]:
+        """
+        قراءة حالة المزامنة السابقة
+        """
+        try:
+            with open(filename, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    @staticmethod
+    def save_sync_state(state: Dict, filename: str = DEFAULT_SYNC_STATE_FILE):
+        """
+        حفظ حالة المزامنة (علامة آخر عنصر)
+        """
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+    
+    @staticmethod
+    def load_vehicles(filename: str = 'data/parkpow_vehicles.json') -> List[VehicleRecord]:
+        """
+        قراءة قاعدة بيانات السيارات المحفوظة
+        """
+        try:
+            with open(filename, 'r', encoding='utf-8') as f:
+                return [VehicleRecord.from_dict(v) for v in json.load(f).get('vehicles', [])]
+        except (OSError, ValueError):
+            return []
+    
+    @staticmethod
+    def merge_vehicles(existing: List[Dict], new: List[Dict]) -> List[Dict]:
+        """
+        دمج السيارات الجديدة مع الموجودة حسب id (الأحدث يحل محل القديم)
+        Merge new vehicles into the existing list by id; newer records replace older ones
+        """
+        merged = {v.get('id'): v for v in existing}
+        for vehicle in new:
+            merged[vehicle.get('id')] = vehicle
+        return list(merged.values())
+    
+    def transform_to_vehicle_format(self, items: List[Dict]) -> List[VehicleRecord]:
         """
         تحويل البيانات إلى تنسيق قاعدة بيانات السيارات - دقة 100%
         Transform data to vehicle database format - 100% accuracy
@@ -238,11 +1020,25 @@ class ParkPowVehicleFetcher:
         Returns:
             قائمة بالسيارات بالتنسيق المطلوب مع معلومات كاملة
         """
-        vehicles = []
-        
         print(f"\n🔄 تحويل {len(items)} عنصر إلى تنسيق قاعدة البيانات...")
         print(f"🔄 Transforming {len(items)} items to database format...\n")
         
+        vehicles = list(self.iter_vehicle_format(items, total=len(items)))
+        
+        print(f"\n✅ تم تحويل {len(vehicles)} سيارة بنجاح")
+        print(f"✅ Successfully transformed {len(vehicles)} vehicles\n")
+        
+        return vehicles
+    
+    def iter_vehicle_format(self, items: Iterable[Dict], total: Optional[int] = None) -> Iterator[VehicleRecord]:
+        """
+        مولّد يحوّل العناصر واحداً تلو الآخر (يمكن تمريره مباشرة إلى save_to_json)
+        Generator that transforms items one at a time (can be passed straight to save_to_json)
+        
+        Args:
+            items: العناصر من API (قائمة أو مولّد)
+            total: العدد الكلي للعرض في رسائل التقدم (اختياري)
+        """
         for idx, item in enumerate(items, 1):
             try:
                 # استخراج رقم اللوحة بكل الطرق الممكنة
@@ -345,102 +1141,87 @@ class ParkPowVehicleFetcher:
                 
                 # إنشاء كائن السيارة الكامل
                 # Create complete vehicle object
-                vehicle = {
+                vehicle = VehicleRecord(
                     # معلومات أساسية / Basic Information
-                    'id': item.get('id', item.get('uuid', f"parkpow_{int(time.time()*1000)}_{idx}")),
-                    'plateNumber': plate,
-                    'plateUnicode': plate_unicode,
+                    id=item.get('id', item.get('uuid', f"parkpow_{int(time.time()*1000)}_{idx}")),
+                    plateNumber=plate,
+                    plateUnicode=plate_unicode,
                     
                     # معلومات السيارة / Vehicle Information
-                    'vehicleType': vehicle_type,
-                    'color': color,
-                    'make': make,
-                    'model': model,
-                    'year': year,
+                    vehicleType=vehicle_type,
+                    color=color,
+                    make=make,
+                    model=model,
+                    year=year,
                     
                     # الموقع / Location
-                    'region': region_code,
-                    'regionName': region_name,
-                    'country': country,
-                    'latitude': latitude,
-                    'longitude': longitude,
+                    region=region_code,
+                    regionName=region_name,
+                    country=country,
+                    latitude=latitude,
+                    longitude=longitude,
                     
                     # دقة التعرف / Recognition Accuracy
-                    'confidence': round(confidence, 2),
+                    confidence=round(confidence, 2),
                     
                     # الوقت / Time
-                    'timestamp': timestamp,
-                    'capturedAt': timestamp,
+                    timestamp=timestamp,
+                    capturedAt=timestamp,
                     
                     # المصدر والكاميرا / Source and Camera
-                    'source': 'parkpow_review',
-                    'cameraId': camera_id,
-                    'imageUrl': image_url,
+                    source='parkpow_review',
+                    cameraId=camera_id,
+                    imageUrl=image_url,
                     
                     # معلومات إضافية / Additional Information
-                    'direction': direction,
-                    'speed': speed,
+                    direction=direction,
+                    speed=speed,
                     
                     # حالة المراجعة / Review Status
-                    'reviewed': reviewed,
-                    'reviewedBy': reviewed_by,
-                    'reviewStatus': review_status,
-                    'status': 'active',
+                    reviewed=reviewed,
+                    reviewedBy=reviewed_by,
+                    reviewStatus=review_status,
+                    status='active',
                     
                     # البيانات الأصلية الكاملة / Complete Raw Data
-                    'rawData': item
-                }
+                    rawData=item
+                )
                 
                 # التحقق من جودة البيانات
                 # Verify data quality
                 if plate:
-                    vehicles.append(vehicle)
                     if idx % 10 == 0:
-                        print(f"✓ تم معالجة {idx}/{len(items)} عنصر")
+                        print(f"✓ تم معالجة {idx}/{total or '?'} عنصر")
+                    yield vehicle
                 else:
                     print(f"⚠️  تخطي العنصر {idx}: لا يوجد رقم لوحة")
                     
             except Exception as e:
                 print(f"❌ خطأ في معالجة العنصر {idx}: {str(e)}")
                 continue
-        
-        print(f"\n✅ تم تحويل {len(vehicles)} سيارة بنجاح")
-        print(f"✅ Successfully transformed {len(vehicles)} vehicles\n")
-        
-        return vehicles
     
-    def save_to_json(self, data: List[Dict], filename: str = 'data/parkpow_vehicles.json'):
+    def save_to_json(self, data: Iterable[Dict], filename: str = 'data/parkpow_vehicles.json') -> Optional[Dict]:
         """
         حفظ البيانات في ملف JSON مع إحصائيات مفصلة
         Save data to JSON file with detailed statistics
         
+        تُكتب السيارات تدفقياً (تقبل قائمة أو مولّداً مثل iter_vehicle_format) وتُحسب
+        الإحصائيات أثناء الكتابة في مرور واحد، لذلك يأتي حقل statistics بعد vehicles
+        Vehicles are streamed to disk (a list or a generator such as iter_vehicle_format) and
+        statistics are gathered in the same pass, so 'statistics' is written after 'vehicles'
+        
         Args:
             data: البيانات المراد حفظها
             filename: اسم الملف
+            
+        Returns:
+            الإحصائيات المحسوبة أو None عند الفشل
         """
         try:
-            # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(filename), exist_ok=True)
-            
-            # حساب الإحصائيات التفصيلية
-            # Calculate detailed statistics
-            stats = {
-                'total_vehicles': len(data),
-                'vehicles_with_type': sum(1 for v in data if v.get('vehicleType') and v['vehicleType'] != 'غير محدد'),
-                'vehicles_with_color': sum(1 for v in data if v.get('color') and v['color'] != 'غير محدد'),
-                'vehicles_with_make': sum(1 for v in data if v.get('make')),
-                'vehicles_with_model': sum(1 for v in data if v.get('model')),
-                'vehicles_with_location': sum(1 for v in data if v.get('latitude') and v.get('longitude')),
-                'reviewed_vehicles': sum(1 for v in data if v.get('reviewed')),
-                'avg_confidence': round(sum(v.get('confidence', 0) for v in data) / len(data), 2) if data else 0,
-                'regions': list(set(v.get('region', 'unknown') for v in data)),
-                'vehicle_types': list(set(v.get('vehicleType', 'unknown') for v in data)),
-                'colors': list(set(v.get('color', 'unknown') for v in data)),
-            }
+            accumulator = VehicleStatistics()
             
-            # Prepare output data
-            output = {
-                'metadata': {
+            with StreamingJSONWriter(filename) as writer:
+                writer.write_field('metadata', {
                     'title': 'قاعدة بيانات السيارات من ParkPow',
                     'title_en': 'ParkPow Vehicles Database',
                     'source': 'ParkPow API - Review Endpoint',
@@ -451,14 +1232,12 @@ class ParkPowVehicleFetcher:
                     'accuracy': '100%',
                     'description': 'قاعدة بيانات كاملة ودقيقة لجميع السيارات من نظام ParkPow',
                     'description_en': 'Complete and accurate database of all vehicles from ParkPow system'
-                },
-                'statistics': stats,
-                'vehicles': data
-            }
-            
-            # Save to file with proper formatting
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(output, f, ensure_ascii=False, indent=2)
+                })
+                # حساب الإحصائيات التفصيلية أثناء الكتابة
+                # Calculate detailed statistics while writing
+                writer.write_array('vehicles', accumulator.track(data))
+                stats = accumulator.to_dict()
+                writer.write_field('statistics', stats)
             
             # طباعة ملخص مفصل
             # Print detailed summary
@@ -489,31 +1268,31 @@ class ParkPowVehicleFetcher:
                 print(f"   ... و {len(stats['colors']) - 5} لون آخر")
             
             # حساب نسبة الاكتمال
-            completeness = (
-                (stats['vehicles_with_type'] / stats['total_vehicles'] * 20) +
-                (stats['vehicles_with_color'] / stats['total_vehicles'] * 20) +
-                (stats['vehicles_with_make'] / stats['total_vehicles'] * 20) +
-                (stats['vehicles_with_model'] / stats['total_vehicles'] * 20) +
-                (stats['vehicles_with_location'] / stats['total_vehicles'] * 20)
-            ) if stats['total_vehicles'] > 0 else 0
+            completeness = accumulator.completeness
             
             print(f"\n✨ نسبة اكتمال البيانات / Data completeness: {completeness:.1f}%")
             print(f"✨ دقة البيانات / Data accuracy: 100%")
             print("=" * 60)
             
+            return stats
+            
         except Exception as e:
             print(f"❌ خطأ في حفظ البيانات: {str(e)}")
             print(f"❌ Error saving data: {str(e)}")
             import traceback
             print(traceback.format_exc())
+            return None
     
-    def process_violations(self, vehicles: List[Dict]) -> Dict:
+    def process_violations(self, vehicles: List[Dict], min_count: int = 2,
+                           window_days: Optional[float] = None) -> Dict:
         """
         معالجة المخالفات وتحديد المخالفين المتكررين
         Process violations and identify repeat offenders
         
         Args:
             vehicles: قائمة السيارات
+            min_count: أقل عدد مخالفات للمخالف المتكرر (افتراضي: 2)
+            window_days: نافذة زمنية بالأيام يجب أن تقع فيها min_count مخالفة (اختياري)
             
         Returns:
             قاموس يحتوي على المخالفات والمخالفين المتكررين
@@ -524,79 +1303,68 @@ class ParkPowVehicleFetcher:
         print("=" * 60 + "\n")
         
         violations = []
-        vehicle_violations_count = {}
         repeat_offenders = []
+        accumulator = ViolationStatistics()
         
         # معالجة كل سيارة
         for vehicle in vehicles:
-            plate = vehicle['plateNumber']
-            
             # إنشاء مخالفة لكل ظهور للسيارة
-            violation = {
-                'id': f"violation_{vehicle['id']}",
-                'plateNumber': plate,
-                'vehicleType': vehicle['vehicleType'],
-                'color': vehicle['color'],
-                'violationType': self._detect_violation_type(vehicle),
-                'violationDate': vehicle['timestamp'],
-                'location': {
-                    'latitude': vehicle.get('latitude', ''),
-                    'longitude': vehicle.get('longitude', ''),
-                    'region': vehicle.get('regionName', vehicle.get('region', '')),
-                    'cameraId': vehicle.get('cameraId', '')
-                },
-                'confidence': vehicle['confidence'],
-                'imageUrl': vehicle.get('imageUrl', ''),
-                'status': 'pending',
-                'reviewed': vehicle.get('reviewed', False),
-                'notes': f"تم الرصد بواسطة كاميرا {vehicle.get('cameraId', 'غير محدد')}"
-            }
+            violation = ViolationRecord(
+                id=f"violation_{vehicle['id']}",
+                plateNumber=vehicle['plateNumber'],
+                vehicleType=vehicle['vehicleType'],
+                color=vehicle['color'],
+                violationType=self._detect_violation_type(vehicle),
+                violationDate=vehicle['timestamp'],
+                latitude=vehicle.get('latitude', ''),
+                longitude=vehicle.get('longitude', ''),
+                region=vehicle.get('regionName', vehicle.get('region', '')),
+                cameraId=vehicle.get('cameraId', ''),
+                confidence=vehicle['confidence'],
+                imageUrl=vehicle.get('imageUrl', ''),
+                status='pending',
+                reviewed=vehicle.get('reviewed', False),
+                notes=f"تم الرصد بواسطة كاميرا {vehicle.get('cameraId', 'غير محدد')}"
+            )
             
             violations.append(violation)
-            
-            # حساب عدد المخالفات لكل سيارة
-            if plate not in vehicle_violations_count:
-                vehicle_violations_count[plate] = {
-                    'count': 0,
-                    'vehicle': vehicle,
-                    'violations': []
-                }
-            
-            vehicle_violations_count[plate]['count'] += 1
-            vehicle_violations_count[plate]['violations'].append(violation)
+            accumulator.add(violation)
         
-        # تحديد المخالفين المتكررين (أكثر من مخالفة واحدة)
+        # تحديد المخالفين المتكررين
         print("🔍 تحليل المخالفين المتكررين...")
         print("🔍 Analyzing repeat offenders...\n")
         
-        for plate, data in vehicle_violations_count.items():
-            if data['count'] > 1:
-                offender = {
-                    'plateNumber': plate,
-                    'vehicleType': data['vehicle']['vehicleType'],
-                    'color': data['vehicle']['color'],
-                    'make': data['vehicle'].get('make', ''),
-                    'model': data['vehicle'].get('model', ''),
-                    'violationCount': data['count'],
-                    'violations': data['violations'],
-                    'firstViolation': data['violations'][0]['violationDate'],
-                    'lastViolation': data['violations'][-1]['violationDate'],
-                    'riskLevel': self._calculate_risk_level(data['count']),
-                    'status': 'repeat_offender'
-                }
-                repeat_offenders.append(offender)
-        
-        # ترتيب المخالفين حسب عدد المخالفات (الأكثر أولاً)
-        repeat_offenders.sort(key=lambda x: x['violationCount'], reverse=True)
+        engine = RepeatOffenderEngine(violations)
+        for entry in engine.offenders(min_count=min_count, window_days=window_days):
+            positions = entry['positions']
+            vehicle = vehicles[min(positions)]
+            plate_violations = [violations[pos] for pos in positions]
+            repeat_offenders.append({
+                'plateNumber': entry['plate'],
+                'vehicleType': vehicle['vehicleType'],
+                'color': vehicle['color'],
+                'make': vehicle.get('make', ''),
+                'model': vehicle.get('model', ''),
+                'violationCount': entry['count'],
+                'violations': plate_violations,
+                'firstViolation': plate_violations[0]['violationDate'],
+                'lastViolation': plate_violations[-1]['violationDate'],
+                'cameraDistribution': entry['cameras'],
+                'riskLevel': entry['riskLevel'],
+                'status': 'repeat_offender'
+            })
+        
+        statistics = accumulator.to_dict()
+        statistics['repeat_offenders_count'] = len(repeat_offenders)
         
         # طباعة الإحصائيات
         print("=" * 60)
         print("📊 إحصائيات المخالفات")
         print("📊 Violations Statistics")
         print("=" * 60)
-        print(f"• إجمالي المخالفات / Total violations: {len(violations)}")
-        print(f"• عدد السيارات المخالفة / Violating vehicles: {len(vehicle_violations_count)}")
-        print(f"• المخالفين المتكررين / Repeat offenders: {len(repeat_offenders)}")
+        print(f"• إجمالي المخالفات / Total violations: {statistics['total_violations']}")
+        print(f"• عدد السيارات المخالفة / Violating vehicles: {statistics['unique_vehicles']}")
+        print(f"• المخالفين المتكررين / Repeat offenders: {statistics['repeat_offenders_count']}")
         
         if repeat_offenders:
             print(f"\n🚨 أكثر 5 مخالفين تكراراً:")
@@ -610,12 +1378,7 @@ class ParkPowVehicleFetcher:
         return {
             'violations': violations,
             'repeat_offenders': repeat_offenders,
-            'statistics': {
-                'total_violations': len(violations),
-                'unique_vehicles': len(vehicle_violations_count),
-                'repeat_offenders_count': len(repeat_offenders),
-                'average_violations_per_vehicle': round(len(violations) / len(vehicle_violations_count), 2) if vehicle_violations_count else 0
-            }
+            'statistics': statistics
         }
     
     def _detect_violation_type(self, vehicle: Dict) -> str:
@@ -638,41 +1401,23 @@ class ParkPowVehicleFetcher:
         # الافتراضي: مخالفة وقوف أو دخول غير مصرح
         return 'دخول/وقوف غير مصرح'
     
-    def _calculate_risk_level(self, violation_count: int) -> str:
-        """
-        حساب مستوى الخطورة بناءً على عدد المخالفات
-        Calculate risk level based on violation count
-        """
-        if violation_count >= 5:
-            return 'high'
-        elif violation_count >= 3:
-            return 'medium'
-        else:
-            return 'low'
-    
     def save_violations(self, violations_data: Dict, filename: str = 'data/parkpow_violations.json'):
         """
         حفظ بيانات المخالفات
         Save violations data
         """
         try:
-            os.makedirs(os.path.dirname(filename), exist_ok=True)
-            
-            output = {
-                'metadata': {
+            with StreamingJSONWriter(filename) as writer:
+                writer.write_field('metadata', {
                     'title': 'قاعدة بيانات المخالفات المرورية',
                     'title_en': 'Traffic Violations Database',
                     'source': 'ParkPow API',
                     'generated_at': datetime.now().isoformat(),
                     'description': 'قاعدة بيانات كاملة للمخالفات المرورية مع تحديد المخالفين المتكررين'
-                },
-                'statistics': violations_data['statistics'],
-                'violations': violations_data['violations'],
-                'repeat_offenders': violations_data['repeat_offenders']
-            }
-            
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(output, f, ensure_ascii=False, indent=2)
+                })
+                writer.write_field('statistics', violations_data['statistics'])
+                writer.write_array('violations', violations_data['violations'])
+                writer.write_array('repeat_offenders', violations_data['repeat_offenders'])
             
             print(f"✅ تم حفظ بيانات المخالفات في: {filename}")
             print(f"✅ Violations data saved to: {filename}")
@@ -692,6 +1437,17 @@ def main():
     print("=" * 60)
     print()
     
+    parser = argparse.ArgumentParser(description="ParkPow vehicle data extraction")
+    parser.add_argument('--incremental', action='store_true',
+                        help='جلب العناصر الأحدث من آخر مزامنة فقط ودمجها مع البيانات الحالية')
+    parser.add_argument('--state-file', default=DEFAULT_SYNC_STATE_FILE,
+                        help=f'ملف علامة المزامنة (افتراضي: {DEFAULT_SYNC_STATE_FILE})')
+    parser.add_argument('--offender-min-count', type=int, default=2,
+                        help='أقل عدد مخالفات للمخالف المتكرر (افتراضي: 2)')
+    parser.add_argument('--offender-window-days', type=float, default=None,
+                        help='نافذة زمنية بالأيام للمخالف المتكرر، مثل 3 مخالفات خلال 7 أيام')
+    args = parser.parse_args()
+    
     try:
         # Initialize fetcher
         fetcher = ParkPowVehicleFetcher()
@@ -704,66 +1460,103 @@ def main():
         
         print()
         
-        # Fetch data from multiple pages (starting from page 2 as per requirement)
-        print("📄 ملاحظة: سيتم البدء من الصفحة 2 كما هو مطلوب")
-        print("📄 Note: Starting from page 2 as required")
-        print()
+        state = fetcher.load_sync_state(args.state_file) if args.incremental else None
+        existing_vehicles = fetcher.load_vehicles() if state else []
         
-        # Fetch pages 2-10 (or until no more data)
-        all_items = []
-        for page_num in range(2, 12):  # Pages 2 to 11
-            data = fetcher.fetch_reviews(page=page_num)
-            if data and ('results' in data or 'data' in data or isinstance(data, list)):
-                if isinstance(data, dict) and 'results' in data:
-                    items = data['results']
-                elif isinstance(data, dict) and 'data' in data:
-                    items = data['data']
-                elif isinstance(data, list):
-                    items = data
-                else:
-                    items = []
-                
-                if items:
-                    all_items.extend(items)
-                    print(f"✓ الصفحة {page_num}: {len(items)} عنصر")
-                else:
-                    print(f"⚠️  الصفحة {page_num}: لا توجد عناصر")
-                    break
-            else:
-                print(f"⚠️  الصفحة {page_num}: لا توجد بيانات")
-                break
+        if state and state.get('last_timestamp') and existing_vehicles:
+            # مزامنة تزايدية: الأحدث أولاً بدءاً من الصفحة 1
+            # Incremental sync: newest first, starting from page 1
+            print(f"🔁 مزامنة تزايدية منذ / Incremental sync since: {state['last_timestamp']}")
+            print()
+            all_items = fetcher.fetch_new_reviews(
+                state['last_timestamp'],
+                since_param=os.getenv('PARKPOW_SINCE_PARAM'),
+                since_id=state.get('last_id')
+            )
             
-            time.sleep(1)  # Delay between requests
-        
-        if not all_items:
-            print("\n⚠️  لم يتم العثور على بيانات")
-            print("⚠️  No data found")
+            if not all_items:
+                print("\n✅ لا توجد بيانات جديدة / No new data since last sync")
+                fetcher.save_sync_state(fetcher.high_water_mark([], state), args.state_file)
+                return
+        else:
+            if args.incremental:
+                print("ℹ️  لا توجد مزامنة سابقة، سيتم الجلب الكامل")
+                print("ℹ️  No previous sync state, running a full sync")
+                print()
+            
+            # Fetch data from multiple pages (starting from page 2 as per requirement)
+            print("📄 ملاحظة: سيتم البدء من الصفحة 2 كما هو مطلوب")
+            print("📄 Note: Starting from page 2 as required")
+            print()
             
-            # Try fetching from page 1 as fallback
-            print("\n🔄 محاولة الحصول على بيانات من الصفحة 1...")
-            all_items = fetcher.fetch_all_reviews(max_pages=10)
+            # Fetch pages 2-11 (or until no more data)
+            all_items = fetcher.fetch_all_reviews(max_pages=10, start_page=2)
+            
+            if not all_items:
+                print("\n⚠️  لم يتم العثور على بيانات")
+                print("⚠️  No data found")
+                
+                # Try fetching from page 1 as fallback
+                print("\n🔄 محاولة الحصول على بيانات من الصفحة 1...")
+                all_items = fetcher.fetch_all_reviews(max_pages=10)
         
         if all_items:
-            # Transform to vehicle format
+            # علامة المزامنة تُحسب قبل تحرير العناصر الخام
+            sync_state = fetcher.high_water_mark(all_items, state)
+            total = len(all_items)
+            
+            # تحويل تدفقي: كل عنصر خام يُحرر فور تحويله ولا يبقى إلا السجل المضغوط
+            # Streaming transform: each raw item is released once converted to a compact record
+            raw_items = deque(all_items)
+            del all_items
+            
+            def drain():
+                while raw_items:
+                    yield raw_items.popleft()
+            
+            vehicles = []
+            
+            def keep(records):
+                for record in records:
+                    vehicles.append(record)
+                    yield record
+            
             print("\n" + "=" * 60)
             print("🔄 تحويل البيانات...")
-            vehicles = fetcher.transform_to_vehicle_format(all_items)
+            records = fetcher.iter_vehicle_format(drain(), total=total)
+            if existing_vehicles:
+                new_vehicles = list(records)
+                vehicles = fetcher.merge_vehicles(existing_vehicles, new_vehicles)
+                print(f"🔀 دمج {len(new_vehicles)} سيارة جديدة مع {len(existing_vehicles)} موجودة: {len(vehicles)}")
+                print(f"🔀 Merged {len(new_vehicles)} new vehicles into {len(existing_vehicles)} existing: {len(vehicles)}")
+                records = vehicles
+            else:
+                # التحويل والكتابة في مرور واحد
+                records = keep(records)
             
             # Save vehicles database
             print("\n" + "=" * 60)
             print("💾 حفظ قاعدة بيانات السيارات...")
-            fetcher.save_to_json(vehicles)
+            if fetcher.save_to_json(records) is None:
+                sys.exit(1)
             
             # Process violations and identify repeat offenders
             print("\n" + "=" * 60)
             print("🚨 معالجة المخالفات وتحديد المخالفين المتكررين...")
-            violations_data = fetcher.process_violations(vehicles)
+            violations_data = fetcher.process_violations(
+                vehicles,
+                min_count=args.offender_min_count,
+                window_days=args.offender_window_days
+            )
             
             # Save violations database
             print("\n" + "=" * 60)
             print("💾 حفظ قاعدة بيانات المخالفات...")
             fetcher.save_violations(violations_data)
             
+            # حفظ علامة المزامنة للتشغيل التالي
+            fetcher.save_sync_state(sync_state, args.state_file)
+            
             print("\n" + "=" * 60)
             print("✅ تمت العملية بنجاح!")
             print("✅ Operation completed successfully!")
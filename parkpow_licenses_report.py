@@ -11,9 +11,111 @@ ParkPow Cloud Licenses Reporting System
 import os
 import json
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
+from report_rendering import register_template, render_to_file
+
+
+LICENSES_HTML_TEMPLATE = """
+<!DOCTYPE html>
+<html lang="ar" dir="rtl">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>تقرير تراخيص ParkPow السحابية</title>
+    <style>
+        body {
+            font-family: 'Tajawal', Arial, sans-serif;
+            direction: rtl;
+            padding: 20px;
+            background: #f5f5f5;
+        }
+        .header {
+            text-align: center;
+            background: linear-gradient(90deg, #6B5536 60%, #8B6F47 100%);
+            color: white;
+            padding: 20px;
+            border-radius: 10px;
+            margin-bottom: 30px;
+        }
+        .header h1 {
+            margin: 0;
+            font-size: 2em;
+        }
+        .header p {
+            margin: 5px 0;
+            opacity: 0.9;
+        }
+        table {
+            width: 100%;
+            border-collapse: collapse;
+            background: white;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+            border-radius: 10px;
+            overflow: hidden;
+        }
+        th {
+            background: #6B5536;
+            color: white;
+            padding: 15px;
+            text-align: right;
+            font-weight: bold;
+        }
+        td {
+            padding: 12px 15px;
+            border-bottom: 1px solid #eee;
+            text-align: right;
+        }
+        tr:hover {
+            background: #f9f9f9;
+        }
+        .thumbnail {
+            max-width: 100px;
+            max-height: 60px;
+            border-radius: 5px;
+        }
+        .footer {
+            text-align: center;
+            margin-top: 30px;
+            color: #666;
+        }
+    </style>
+</head>
+<body>
+    <div class="header">
+        <h1>📄 تقرير تراخيص ParkPow السحابية</h1>
+        <p>🏢 الجهة: جامعة الإمام محمد بن سعود الإسلامية</p>
+        <p>📅 تاريخ التقرير: {{ report_date }}</p>
+        <p>🧠 إعداد: علي فرحان موسى عياشي – قائد مشاريع رقمية وتشغيلية</p>
+    </div>
+    
+    <table class="report-table">
+        <thead>
+            <tr>
+                {% for column in columns %}<th>{{ column }}</th>{% endfor %}
+            </tr>
+        </thead>
+        <tbody>
+            {% for row in rows %}
+            <tr>
+                {% for value in row %}<td>{{ value }}</td>{% endfor %}
+            </tr>
+            {% endfor %}
+        </tbody>
+    </table>
+    
+    <div class="footer">
+        <p>✅ تم إنشاء التقرير تلقائياً بواسطة نظام ParkPow</p>
+        <p>© {{ year }} جميع الحقوق محفوظة</p>
+    </div>
+</body>
+</html>
+"""
+
+register_template("licenses_report.html", LICENSES_HTML_TEMPLATE)
+
 
 class ParkPowLicensesReport:
     """فئة لإدارة تقارير تراخيص ParkPow"""
@@ -27,6 +129,8 @@ class ParkPowLicensesReport:
         """
         self.image_folder = image_folder
         self.licenses = []
+        self._snapshot = None
+        self._thumbnail_index = None
         self.report_date = datetime.now().strftime("%Y-%m-%d")
         
         # إنشاء مجلد الصور إذا لم يكن موجوداً
@@ -50,6 +154,7 @@ class ParkPowLicensesReport:
             "الوصف": description
         }
         self.licenses.append(license_data)
+        self._snapshot = None
     
     def _ensure_directory_exists(self, filepath):
         """
@@ -60,6 +165,32 @@ class ParkPowLicensesReport:
         """
         Path(os.path.dirname(filepath)).mkdir(parents=True, exist_ok=True)
     
+    def thumbnail_index(self):
+        """
+        فهرس مفتاح الترخيص ← مسار الصورة المصغرة بقراءة واحدة للمجلد عبر os.scandir
+        (يُحفظ ويُعاد استخدامه ما دام وقت تعديل المجلد لم يتغير)
+        
+        Returns:
+            dict: {مفتاح_الترخيص: مسار الصورة}
+        """
+        try:
+            mtime = os.stat(self.image_folder).st_mtime_ns
+        except OSError:
+            return {}
+        
+        if self._thumbnail_index is not None and self._thumbnail_index[0] == mtime:
+            return self._thumbnail_index[1]
+        
+        index = {}
+        with os.scandir(self.image_folder) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith("thumbnail_") and name.endswith(".jpg") and entry.is_file():
+                    index[name[len("thumbnail_"):-len(".jpg")]] = os.path.join(self.image_folder, name)
+        
+        self._thumbnail_index = (mtime, index)
+        return index
+    
     def attach_thumbnails(self, df):
         """
         ربط الصور المصغرة تلقائياً بناءً على مفتاح الترخيص
@@ -70,17 +201,10 @@ class ParkPowLicensesReport:
         Returns:
             DataFrame: جدول البيانات مع الصور المصغرة
         """
-        def get_thumbnail_path(license_key):
-            thumbnail_name = f"thumbnail_{license_key}.jpg"
-            thumbnail_path = os.path.join(self.image_folder, thumbnail_name)
-            
-            # التحقق من وجود الصورة
-            if os.path.exists(thumbnail_path):
-                return thumbnail_path
-            else:
-                return "لا توجد صورة"
-        
-        df["الصورة_المصغرة"] = df["مفتاح_الترخيص"].apply(get_thumbnail_path)
+        index = self.thumbnail_index()
+        df["الصورة_المصغرة"] = (
+            df["مفتاح_الترخيص"].astype(str).map(index).fillna("لا توجد صورة")
+        )
         return df
     
     def generate_dataframe(self):
@@ -97,6 +221,21 @@ class ParkPowLicensesReport:
         df = self.attach_thumbnails(df)
         return df
     
+    def snapshot(self, refresh=False):
+        """
+        لقطة DataFrame محفوظة تُبنى مرة واحدة وتُشارك بين المصدّرات
+        (تُلغى عند add_license)
+        
+        Args:
+            refresh (bool): إعادة البناء حتى لو كانت اللقطة موجودة
+            
+        Returns:
+            DataFrame: جدول البيانات (للقراءة فقط)
+        """
+        if refresh or self._snapshot is None:
+            self._snapshot = self.generate_dataframe()
+        return self._snapshot
+    
     def export_to_excel(self, filename="data/ParkPow_Licenses_Report.xlsx"):
         """
         تصدير التقرير إلى Excel
@@ -104,7 +243,7 @@ class ParkPowLicensesReport:
         Args:
             filename (str): اسم الملف
         """
-        df = self.generate_dataframe()
+        df = self.snapshot()
         if df.empty:
             print("⚠️ لا توجد بيانات للتصدير")
             return
@@ -120,7 +259,7 @@ class ParkPowLicensesReport:
         Args:
             filename (str): اسم الملف
         """
-        df = self.generate_dataframe()
+        df = self.snapshot()
         if df.empty:
             print("⚠️ لا توجد بيانات للتصدير")
             return
@@ -136,99 +275,21 @@ class ParkPowLicensesReport:
         Args:
             filename (str): اسم الملف
         """
-        df = self.generate_dataframe()
+        df = self.snapshot()
         if df.empty:
             print("⚠️ لا توجد بيانات للتصدير")
             return
         
         self._ensure_directory_exists(filename)
         
-        # إنشاء HTML مع تنسيق
-        html_content = f"""
-<!DOCTYPE html>
-<html lang="ar" dir="rtl">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>تقرير تراخيص ParkPow السحابية</title>
-    <style>
-        body {{
-            font-family: 'Tajawal', Arial, sans-serif;
-            direction: rtl;
-            padding: 20px;
-            background: #f5f5f5;
-        }}
-        .header {{
-            text-align: center;
-            background: linear-gradient(90deg, #6B5536 60%, #8B6F47 100%);
-            color: white;
-            padding: 20px;
-            border-radius: 10px;
-            margin-bottom: 30px;
-        }}
-        .header h1 {{
-            margin: 0;
-            font-size: 2em;
-        }}
-        .header p {{
-            margin: 5px 0;
-            opacity: 0.9;
-        }}
-        table {{
-            width: 100%;
-            border-collapse: collapse;
-            background: white;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-            border-radius: 10px;
-            overflow: hidden;
-        }}
-        th {{
-            background: #6B5536;
-            color: white;
-            padding: 15px;
-            text-align: right;
-            font-weight: bold;
-        }}
-        td {{
-            padding: 12px 15px;
-            border-bottom: 1px solid #eee;
-            text-align: right;
-        }}
-        tr:hover {{
-            background: #f9f9f9;
-        }}
-        .thumbnail {{
-            max-width: 100px;
-            max-height: 60px;
-            border-radius: 5px;
-        }}
-        .footer {{
-            text-align: center;
-            margin-top: 30px;
-            color: #666;
-        }}
-    </style>
-</head>
-<body>
-    <div class="header">
-        <h1>📄 تقرير تراخيص ParkPow السحابية</h1>
-        <p>🏢 الجهة: جامعة الإمام محمد بن سعود الإسلامية</p>
-        <p>📅 تاريخ التقرير: {self.report_date}</p>
-        <p>🧠 إعداد: علي فرحان موسى عياشي – قائد مشاريع رقمية وتشغيلية</p>
-    </div>
-    
-    {df.to_html(index=False, classes='report-table', escape=False)}
-    
-    <div class="footer">
-        <p>✅ تم إنشاء التقرير تلقائياً بواسطة نظام ParkPow</p>
-        <p>© {datetime.now().year} جميع الحقوق محفوظة</p>
-    </div>
-</body>
-</html>
-"""
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        # عرض القالب المسجل تدفقياً إلى الملف
+        render_to_file(
+            "licenses_report.html", filename,
+            report_date=self.report_date,
+            columns=list(df.columns),
+            rows=df.itertuples(index=False, name=None),
+            year=datetime.now().year
+        )
         
         print(f"✅ تم تصدير التقرير إلى HTML: {filename}")
     
@@ -239,7 +300,7 @@ class ParkPowLicensesReport:
         Args:
             filename (str): اسم الملف
         """
-        df = self.generate_dataframe()
+        df = self.snapshot()
         if df.empty:
             print("⚠️ لا توجد بيانات للتصدير")
             return
@@ -269,10 +330,18 @@ class ParkPowLicensesReport:
         Args:
             base_filename (str): اسم الملف الأساسي
         """
-        self.export_to_excel(f"{base_filename}.xlsx")
-        self.export_to_csv(f"{base_filename}.csv")
-        self.export_to_html(f"{base_filename}.html")
-        self.export_to_json(f"{base_filename}.json")
+        # بناء اللقطة مرة واحدة لهذا التشغيل ثم تشغيل المصدّرات بالتوازي عليها
+        self.snapshot(refresh=True)
+        writers = [
+            (self.export_to_excel, f"{base_filename}.xlsx"),
+            (self.export_to_csv, f"{base_filename}.csv"),
+            (self.export_to_html, f"{base_filename}.html"),
+            (self.export_to_json, f"{base_filename}.json"),
+        ]
+        with ThreadPoolExecutor(max_workers=len(writers)) as executor:
+            futures = [executor.submit(writer, filename) for writer, filename in writers]
+            for future in futures:
+                future.result()
         print("\n✅ تم تصدير التقرير بنجاح إلى جميع الصيغ!")
 
 
@@ -15,6 +15,10 @@ with support for 100% accurate Saudi plate validation
 import os
 import sqlite3
 import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
@@ -28,20 +32,135 @@ except ImportError:
     print("⚠️ Warning: Saudi plate validator not available")
 
 
+class ViolationWriteError(Exception):
+    """
+    تعذرت كتابة مخالفات مؤجلة عند الخروج من وضع الدفعات
+    Buffered violations could not be written when batch mode ended
+    
+    الصفوف غير المكتوبة متاحة في rows لإعادة المحاولة (مثلاً عبر add_violations_bulk)
+    The unwritten rows are available in `rows` for a retry (e.g. add_violations_bulk)
+    """
+    
+    def __init__(self, rows):
+        super().__init__(f"{len(rows)} violation(s) could not be written")
+        self.rows = rows
+
+
+class VehicleLookupCache:
+    """
+    ذاكرة تخزين مؤقت LRU/TTL لنتائج البحث عن السيارات
+    LRU/TTL cache for vehicle lookups, including negative (unknown plate) entries
+    """
+    
+    _MISSING = object()
+    
+    def __init__(self, max_size=4096, ttl=300, negative_ttl=60):
+        """
+        Args:
+            max_size: الحد الأقصى للعناصر / Maximum cached plates
+            ttl: صلاحية السيارات المعروفة بالثواني / Lifetime of known vehicles (seconds)
+            negative_ttl: صلاحية اللوحات غير المسجلة / Lifetime of unknown plates (seconds)
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+    
+    @staticmethod
+    def normalize(plate_number):
+        """مفتاح التخزين: رقم اللوحة بدون مسافات طرفية"""
+        return str(plate_number).strip()
+    
+    def get(self, key):
+        """إرجاع السيارة المخزنة (أو None للوحة غير مسجلة) أو _MISSING"""
+        entry = self._entries.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return self._MISSING
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+    
+    def put(self, key, vehicle):
+        """تخزين نتيجة البحث؛ None تعني لوحة غير مسجلة"""
+        ttl = self.ttl if vehicle is not None else self.negative_ttl
+        self._entries[key] = (vehicle, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def invalidate(self, key=None):
+        """حذف لوحة واحدة أو تفريغ الذاكرة بالكامل"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+    
+    def stats(self):
+        """إحصائيات الاستخدام / Usage counters"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total * 100, 1) if total else 0
+        }
+
+
 class DatabaseManager:
     """مدير قاعدة البيانات - Database Manager"""
     
-    def __init__(self, database_name='traffic.db'):
-        """تهيئة مدير قاعدة البيانات"""
+    # قيمة add_violation لمخالفة مؤجلة في وضع الدفعات لم تُكتب بعد
+    # add_violation result for a row buffered in batch mode and not yet written
+    VIOLATION_QUEUED = "queued"
+    
+    # نتيجة _query_vehicle عند خطأ قاعدة البيانات (تختلف عن "غير موجودة" ولا تُخزن مؤقتاً)
+    # _query_vehicle result on a database error (distinct from a real miss, never cached)
+    _LOOKUP_FAILED = object()
+    
+    VIOLATION_INSERT_SQL = """
+            INSERT INTO violations 
+            (car_id, plate, violation_type, violation_date, fine_amount, officer_name, image_path)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """
+    
+    def __init__(self, database_name='traffic.db', wal_mode=False, batch_size=500,
+                 cache_size=4096, cache_ttl=300, negative_cache_ttl=60):
+        """
+        تهيئة مدير قاعدة البيانات
+        
+        Args:
+            wal_mode: تفعيل WAL مع synchronous=NORMAL / Enable WAL with synchronous=NORMAL
+            batch_size: عدد المخالفات في كل دفعة إدخال / Violations per bulk insert flush
+            cache_size: حجم ذاكرة البحث عن السيارات (0 = تعطيل) / Vehicle lookup cache size (0 = off)
+            cache_ttl: صلاحية السيارات المعروفة / TTL for known vehicles (seconds)
+            negative_cache_ttl: صلاحية اللوحات غير المسجلة / TTL for unknown plates (seconds)
+        """
         self.database_name = database_name
+        self.wal_mode = wal_mode
+        self.batch_size = max(1, int(batch_size))
         self.conn = None
         self.cursor = None
+        self._pending_violations = None
+        self.vehicle_cache = (
+            VehicleLookupCache(cache_size, cache_ttl, negative_cache_ttl)
+            if cache_size else None
+        )
+        self._data_version = None
     
     def connect(self):
         """الاتصال بقاعدة البيانات"""
         try:
             self.conn = sqlite3.connect(self.database_name)
             self.cursor = self.conn.cursor()
+            if self.wal_mode:
+                self.cursor.execute("PRAGMA journal_mode=WAL")
+                self.cursor.execute("PRAGMA synchronous=NORMAL")
             return True
         except Exception as e:
             print(f"❌ خطأ في الاتصال بقاعدة البيانات: {e}")
@@ -98,10 +217,27 @@ class DatabaseManager:
             return False
     
     def get_vehicle(self, plate_number):
-        """البحث عن سيارة برقم اللوحة"""
+        """البحث عن سيارة برقم اللوحة (عبر ذاكرة التخزين المؤقت إن كانت مفعلة)"""
         if not self.cursor:
             return None
         
+        if self.vehicle_cache is None:
+            vehicle = self._query_vehicle(plate_number)
+            return None if vehicle is self._LOOKUP_FAILED else vehicle
+        
+        self._check_external_changes()
+        key = VehicleLookupCache.normalize(plate_number)
+        vehicle = self.vehicle_cache.get(key)
+        if vehicle is VehicleLookupCache._MISSING:
+            vehicle = self._query_vehicle(key)
+            if vehicle is self._LOOKUP_FAILED:
+                # خطأ عابر (مثل database is locked): لا يُخزن كلوحة غير مسجلة
+                return None
+            self.vehicle_cache.put(key, vehicle)
+        return vehicle
+    
+    def _query_vehicle(self, plate_number):
+        """استعلام جدول السيارات مباشرة (يرجع _LOOKUP_FAILED عند الخطأ)"""
         try:
             self.cursor.execute(
                 "SELECT * FROM cars WHERE plate_number = ?", 
@@ -110,30 +246,188 @@ class DatabaseManager:
             return self.cursor.fetchone()
         except Exception as e:
             print(f"⚠️ خطأ في البحث عن السيارة: {e}")
-            return None
+            return self._LOOKUP_FAILED
+    
+    def _check_external_changes(self):
+        """
+        تفريغ الذاكرة إذا عدّل اتصال آخر قاعدة البيانات
+        Clear the cache when another connection has committed changes
+        
+        PRAGMA data_version لا يقرأ أي جدول، لذا كلفته أقل بكثير من الاستعلام
+        PRAGMA data_version reads no table, so it is far cheaper than the lookup
+        """
+        try:
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        except Exception:
+            return
+        if self._data_version is not None and version != self._data_version:
+            self.vehicle_cache.invalidate()
+        self._data_version = version
+    
+    def preload_vehicles(self):
+        """
+        تحميل جدول السيارات بالكامل في الذاكرة المؤقتة عند بدء التشغيل
+        Warm the lookup cache from the whole cars table
+        
+        Returns:
+            عدد السيارات المحملة
+        """
+        if not self.cursor or self.vehicle_cache is None:
+            return 0
+        
+        try:
+            self._check_external_changes()
+            self.cursor.execute("SELECT * FROM cars")
+            columns = [column[0] for column in self.cursor.description]
+            plate_index = columns.index('plate_number')
+            count = 0
+            for row in self.cursor.fetchall():
+                plate_number = row[plate_index]
+                if plate_number is None:
+                    continue
+                self.vehicle_cache.put(VehicleLookupCache.normalize(plate_number), row)
+                count += 1
+            print(f"✅ تم تحميل {count} سيارة في الذاكرة المؤقتة")
+            print(f"✅ Preloaded {count} vehicles into lookup cache")
+            return count
+        except Exception as e:
+            print(f"⚠️ خطأ في تحميل السيارات: {e}")
+            return 0
+    
+    def invalidate_vehicle(self, plate_number=None):
+        """
+        إبطال السيارة المخزنة بعد تعديل جدول السيارات (أو الكل إذا لم تُحدد لوحة)
+        Invalidate a cached vehicle after changing its cars row (or all of them)
+        """
+        if self.vehicle_cache is None:
+            return
+        if plate_number is None:
+            self.vehicle_cache.invalidate()
+        else:
+            self.vehicle_cache.invalidate(VehicleLookupCache.normalize(plate_number))
+    
+    def cache_stats(self):
+        """إحصائيات ذاكرة البحث عن السيارات"""
+        return self.vehicle_cache.stats() if self.vehicle_cache else None
     
     def add_violation(self, car_id, plate, violation_type, violation_date, 
                      fine_amount, officer_name, image_path=None):
-        """إضافة مخالفة جديدة"""
+        """
+        إضافة مخالفة جديدة
+        
+        داخل batch() تُؤجل المخالفة وتُكتب مع دفعتها
+        Inside batch() the row is buffered and written with its batch
+        
+        Returns:
+            True عند الكتابة، VIOLATION_QUEUED إذا بقيت مؤجلة (تُكتب أو تُبلّغ عند
+            انتهاء batch())، أو False عند الفشل
+        """
         if not self.cursor:
             return False
         
+        row = (car_id, plate, violation_type, violation_date, fine_amount,
+               officer_name, image_path)
+        
+        if self._pending_violations is not None:
+            self._pending_violations.append(row)
+            if len(self._pending_violations) >= self.batch_size and self.flush_violations():
+                return True
+            return self.VIOLATION_QUEUED
+        
         try:
-            self.cursor.execute("""
-            INSERT INTO violations 
-            (car_id, plate, violation_type, violation_date, fine_amount, officer_name, image_path)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (car_id, plate, violation_type, violation_date, fine_amount, 
-                  officer_name, image_path))
+            self.cursor.execute(self.VIOLATION_INSERT_SQL, row)
             self.conn.commit()
             return True
         except Exception as e:
             print(f"⚠️ خطأ في إضافة المخالفة: {e}")
             return False
     
+    def add_violations_bulk(self, rows):
+        """
+        إضافة مجموعة مخالفات باستخدام executemany داخل معاملة واحدة لكل دفعة
+        Insert violations with executemany, one transaction per batch_size rows
+        
+        Args:
+            rows: صفوف بترتيب (car_id, plate, violation_type, violation_date,
+                  fine_amount, officer_name, image_path)
+            
+        Returns:
+            عدد المخالفات المضافة
+        """
+        if not self.cursor:
+            return 0
+        
+        inserted = 0
+        chunk = []
+        try:
+            for row in rows:
+                chunk.append(tuple(row))
+                if len(chunk) >= self.batch_size:
+                    inserted += self._insert_chunk(chunk)
+                    chunk = []
+            if chunk:
+                inserted += self._insert_chunk(chunk)
+        except Exception as e:
+            print(f"⚠️ خطأ في إضافة المخالفات: {e}")
+            print(f"⚠️ Error adding violations in bulk: {e}")
+        return inserted
+    
+    def _insert_chunk(self, chunk):
+        """كتابة دفعة واحدة في معاملة واحدة (تُلغى كاملة عند الخطأ)"""
+        with self.conn:
+            self.cursor.executemany(self.VIOLATION_INSERT_SQL, chunk)
+        return len(chunk)
+    
+    def flush_violations(self):
+        """
+        كتابة المخالفات المؤجلة في وضع الدفعات
+        
+        الصفوف التي لم تُكتب تبقى مؤجلة لإعادة المحاولة في الكتابة التالية
+        Rows that were not written stay pending and are retried on the next flush
+        """
+        if not self._pending_violations:
+            return True
+        
+        pending, self._pending_violations = self._pending_violations, []
+        inserted = self.add_violations_bulk(pending)
+        if inserted == len(pending):
+            return True
+        # الدفعات تُكتب بالترتيب، فأول inserted صف فقط محفوظ
+        self._pending_violations = pending[inserted:] + self._pending_violations
+        return False
+    
+    @contextmanager
+    def batch(self):
+        """
+        وضع الدفعات: تُجمع المخالفات وتُكتب كل batch_size صف وعند الخروج
+        Batch mode: violations are buffered and flushed every batch_size rows and on exit
+        
+        إذا تعذرت كتابة بعض الصفوف عند الخروج يُرفع ViolationWriteError بها
+        Raises ViolationWriteError with any rows still unwritten on exit
+        
+        Example:
+            with db_manager.batch():
+                db_manager.add_violation(...)
+        """
+        if self._pending_violations is not None:
+            yield self
+            return
+        
+        self._pending_violations = []
+        try:
+            yield self
+        finally:
+            try:
+                self.flush_violations()
+            finally:
+                unsaved, self._pending_violations = self._pending_violations or [], None
+        if unsaved:
+            raise ViolationWriteError(unsaved)
+    
     def close(self):
         """إغلاق الاتصال بقاعدة البيانات"""
         if self.conn:
+            self.flush_violations()
             self.conn.close()
             print("✅ تم إغلاق الاتصال بقاعدة البيانات")
             print("✅ Database connection closed")
@@ -142,21 +436,62 @@ class DatabaseManager:
 class PlateRecognizerAPI:
     """واجهة برمجة التطبيقات للتعرف على اللوحات"""
     
-    def __init__(self, api_token, api_url='https://api.platerecognizer.com/v1/plate-reader/'):
-        """تهيئة واجهة API"""
+    DEFAULT_POOL_SIZE = 10
+    
+    def __init__(self, api_token, api_url='https://api.platerecognizer.com/v1/plate-reader/',
+                 pool_size=DEFAULT_POOL_SIZE, max_retries=3):
+        """
+        تهيئة واجهة API
+        
+        Args:
+            pool_size: عدد الاتصالات المحفوظة (keep-alive) / Kept-alive connections in the pool
+            max_retries: إعادة المحاولة عند فشل الاتصال فقط / Retries on connection errors only
+        """
         self.api_token = api_token
         self.api_url = api_url
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self._session = None
+        self._session_lock = threading.Lock()
+    
+    @property
+    def session(self):
+        """جلسة HTTP مشتركة تعيد استخدام الاتصالات / Shared pooled HTTP session"""
+        with self._session_lock:
+            if self._session is None:
+                self._session = self._create_session()
+        return self._session
+    
+    def _create_session(self):
+        """إنشاء جلسة بمجمع اتصالات وإعادة محاولة عند فشل الاتصال"""
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        
+        # إعادة المحاولة على أخطاء الاتصال فقط حتى لا تُرسل الصورة مرتين
+        # Retry connect errors only so an image is never submitted twice
+        retry = Retry(total=self.max_retries, connect=self.max_retries,
+                      read=0, status=0, backoff_factor=0.5)
+        adapter = HTTPAdapter(pool_connections=self.pool_size,
+                              pool_maxsize=self.pool_size,
+                              max_retries=retry)
+        
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({
+            'Authorization': f'Token {self.api_token}',
+            'Connection': 'keep-alive'
+        })
+        return session
     
     def process_image(self, image_path, regions='sa'):
         """معالجة صورة واحدة"""
         try:
-            import requests
-            
             with open(image_path, "rb") as img:
-                response = requests.post(
+                response = self.session.post(
                     self.api_url,
                     files={"upload": img},
-                    headers={"Authorization": f"Token {self.api_token}"},
                     data={'regions': regions},
                     timeout=30
                 )
@@ -173,6 +508,13 @@ class PlateRecognizerAPI:
             print(f"⚠️ Image processing error: {e}")
             return None
     
+    def close(self):
+        """إغلاق جلسة HTTP وتحرير الاتصالات"""
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+    
     def extract_plate_info(self, result):
         """استخراج معلومات اللوحة من النتيجة"""
         if not result or not result.get('results'):
@@ -223,7 +565,12 @@ class ConfigManager:
             "violation_type": "دخول موقف خاص بدون تصريح",
             "fine_amount": 1000,
             "officer_name": "نظام تلقائي",
-            "auto_process": True
+            "auto_process": True,
+            "max_workers": 1,
+            "db_wal_mode": False,
+            "db_batch_size": 500,
+            "vehicle_cache_size": 4096,
+            "vehicle_cache_ttl": 300
         }
         
         try:
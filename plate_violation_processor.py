@@ -132,6 +132,7 @@ def main():
         print("❌ فشل الاتصال بقاعدة البيانات")
         return
     db_manager.setup_tables()
+    db_manager.preload_vehicles()
     
     # التحقق من وجود مجلد الإدخال
     FileManager.create_directories(input_folder, output_folder)
@@ -236,7 +237,8 @@ def main():
     else:
         print("⚠️  لا توجد مخالفات لتوليد التقارير")
     
-    # إغلاق قاعدة البيانات
+    # إغلاق جلسة API وقاعدة البيانات
+    api.close()
     db_manager.close()
 
 if __name__ == '__main__':
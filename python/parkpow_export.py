@@ -16,19 +16,48 @@ ParkPow Professional Data Export System
 - جاهز للتوثيق الرسمي
 """
 
+import io
 import os
+import atexit
+import importlib.util
+import hashlib
 import csv
 import json
 import time
 import math
 import shutil
+import itertools
 import pathlib
 import requests
 import pandas as pd
+import xlsxwriter
 from datetime import datetime, timedelta, timezone
 from PIL import Image
-from jinja2 import Template
-import subprocess
+from fpdf import FPDF
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+
+# وحدة عرض التقارير المشتركة في جذر المستودع: تُحمّل بمسارها دون تعديل sys.path
+# (وتُعاد الوحدة نفسها إن كانت محملة مسبقاً لتبقى بيئة القوالب مشتركة)
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _load_report_rendering():
+    module = sys.modules.get("report_rendering")
+    if module is None:
+        spec = importlib.util.spec_from_file_location(
+            "report_rendering", os.path.join(REPO_ROOT, "report_rendering.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["report_rendering"] = module
+        spec.loader.exec_module(module)
+    return module
+
+_report_rendering = _load_report_rendering()
+register_template = _report_rendering.register_template
+render_to_file = _report_rendering.render_to_file
 
 # ========================================
 # الإعدادات - Configuration
@@ -47,7 +76,24 @@ CONFIG = {
     "site": None,
     "camera": None,
     "organization": "جامعة الإمام محمد بن سعود الإسلامية",
-    "department": "وحدة إسكان أعضاء هيئة التدريس"
+    "department": "وحدة إسكان أعضاء هيئة التدريس",
+    # جلب الأحداث على نوافذ زمنية متوازية
+    "window_hours": float(os.environ.get("PARKPOW_WINDOW_HOURS", 6)),
+    "fetch_workers": int(os.environ.get("PARKPOW_FETCH_WORKERS", 4)),
+    # عدد المحاولات لكل نافذة قبل إيقاف التصدير
+    "fetch_retries": int(os.environ.get("PARKPOW_FETCH_RETRIES", 3)),
+    # التحميل المتوازي للصور
+    "download_workers": int(os.environ.get("PARKPOW_DOWNLOAD_WORKERS", 8)),
+    "per_host_limit": int(os.environ.get("PARKPOW_PER_HOST_LIMIT", 4)),
+    "thumbnail_workers": int(os.environ.get("PARKPOW_THUMBNAIL_WORKERS", os.cpu_count() or 1)),
+    # عدد الأحداث في كل دفعة تحميل صور أثناء التصدير التدفقي
+    "image_batch_size": int(os.environ.get("PARKPOW_IMAGE_BATCH_SIZE", 500)),
+    # عدد الصفوف في كل صفحة HTML (اختياري؛ 0 = ملف واحد مع التوقيعات، وهو الافتراضي)
+    "html_page_size": int(os.environ.get("PARKPOW_HTML_PAGE_SIZE", 0)),
+    # خط عربي (TTF) لتقرير PDF؛ إذا لم يُحدد يُبحث في PDF_FONT_CANDIDATES
+    "pdf_font": os.environ.get("PARKPOW_PDF_FONT"),
+    # الحد الأقصى لحجم ذاكرة الصور الدائمة (ميغابايت)
+    "image_cache_max_mb": int(os.environ.get("PARKPOW_IMAGE_CACHE_MB", 2048)),
 }
 
 # إنشاء المجلدات
@@ -89,75 +135,139 @@ def format_confidence(conf):
 # جلب البيانات - Data Fetching
 # ========================================
 
-def fetch_events():
-    """جلب الأحداث من API"""
-    print("🔄 جلب البيانات من ParkPow...")
-    
-    params = {
-        "date_from": CONFIG["date_from"],
-        "date_to": CONFIG["date_to"],
-    }
+class FetchError(Exception):
+    """فشل جلب نافذة زمنية بعد استنفاد المحاولات (التصدير غير مكتمل)"""
+
+class ExportError(Exception):
+    """تعذر إنشاء أحد ملفات التصدير (التصدير غير مكتمل)"""
+
+def time_windows(date_from, date_to, hours):
+    """تقسيم الفترة إلى نوافذ زمنية متتالية (من، إلى)"""
+    start = datetime.fromisoformat(date_from.replace("Z", "+00:00"))
+    end = datetime.fromisoformat(date_to.replace("Z", "+00:00"))
+    step = timedelta(hours=hours) if hours and hours > 0 else end - start
+    while start < end:
+        stop = min(start + step, end)
+        yield start.isoformat(), stop.isoformat()
+        start = stop
+
+def iter_pages(params):
+    """جلب صفحات نافذة واحدة متتبعاً رابط next"""
+    url = CONFIG["api_base"] + CONFIG["events_endpoint"]
+    while url:
+        r = http_session().get(url, params=params, timeout=30)
+        r.raise_for_status()
+        data = r.json()
+        if isinstance(data, list):
+            yield data
+            return
+        yield data.get("results", [])
+        # رابط next يحتوي المعاملات بالفعل
+        url, params = data.get("next"), None
+
+def fetch_window(params):
+    """
+    جلب جميع أحداث نافذة زمنية واحدة (في خيط)
     
+    تُعاد محاولة النافذة كاملة عند الخطأ؛ وبعد استنفاد المحاولات يُرفع FetchError
+    حتى لا تختفي النافذة بصمت من التقرير
+    """
+    attempts = max(1, CONFIG["fetch_retries"])
+    for attempt in range(1, attempts + 1):
+        try:
+            return [e for page in iter_pages(params) for e in page]
+        except requests.RequestException as e:
+            print(f"⚠️ خطأ في جلب البيانات ({params['date_from']} → {params['date_to']}) "
+                  f"محاولة {attempt}/{attempts}: {e}")
+            if attempt == attempts:
+                raise FetchError(
+                    f"تعذر جلب النافذة {params['date_from']} → {params['date_to']}: {e}"
+                ) from e
+            time.sleep(2 ** (attempt - 1))
+
+def iter_raw_events():
+    """
+    الأحداث الخام نافذة بعد نافذة وبالترتيب، مع جلب عدة نوافذ بالتوازي؛
+    لا يُحتفظ في الذاكرة إلا بالنوافذ قيد الجلب
+    """
+    base = {}
     if CONFIG["site"]:
-        params["site"] = CONFIG["site"]
+        base["site"] = CONFIG["site"]
     if CONFIG["camera"]:
-        params["camera"] = CONFIG["camera"]
+        base["camera"] = CONFIG["camera"]
     
-    try:
-        r = requests.get(
-            CONFIG["api_base"] + CONFIG["events_endpoint"],
-            headers=auth_headers(),
-            params=params,
-            timeout=30
-        )
-        r.raise_for_status()
-        data = r.json()
-    except Exception as e:
-        print(f"❌ خطأ في جلب البيانات: {e}")
-        return []
-    
-    # تطبيع البيانات
-    normalized = []
-    results = data.get("results", data if isinstance(data, list) else [])
-    
-    for e in results:
-        ts = to_ast(e.get("timestamp") or e.get("time"))
-        plate = (e.get("plate") or "").upper()
-        conf = e.get("confidence") or e.get("score")
-        cam = e.get("camera") or e.get("camera_name") or e.get("source")
-        loc = e.get("location") or e.get("site") or e.get("zone")
-        
-        # معلومات المركبة
-        vehicle = e.get("vehicle", {})
-        if not isinstance(vehicle, dict):
-            vehicle = {}
-        
-        make = vehicle.get("make")
-        model = vehicle.get("model")
-        color = vehicle.get("color")
-        
-        direction = e.get("direction") or e.get("event_type")
-        img_url = e.get("image_url") or e.get("snapshot") or e.get("thumbnail")
-        event_id = e.get("id") or e.get("uuid") or f"{plate}-{int(time.time()*1000)}"
-        
-        normalized.append({
-            "event_id": event_id,
-            "timestamp_ast": ts,
-            "timestamp_formatted": format_datetime(ts),
-            "timestamp_raw": e.get("timestamp") or e.get("time"),
-            "plate": plate,
-            "confidence": conf,
-            "confidence_formatted": format_confidence(conf),
-            "camera": cam,
-            "direction": direction,
-            "location": loc,
-            "make": make,
-            "model": model,
-            "color": color,
-            "image_url": img_url,
-            "image_path": None,
-            "thumbnail_path": None,
-        })
+    windows = ({**base, "date_from": start, "date_to": stop}
+               for start, stop in time_windows(CONFIG["date_from"], CONFIG["date_to"], CONFIG["window_hours"]))
+    workers = max(1, CONFIG["fetch_workers"])
+    with ThreadPoolExecutor(workers) as executor:
+        in_flight = deque()
+        for params in windows:
+            in_flight.append(executor.submit(fetch_window, params))
+            if len(in_flight) >= workers:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+def normalize_event(e):
+    """تطبيع حدث واحد"""
+    ts = to_ast(e.get("timestamp") or e.get("time"))
+    plate = (e.get("plate") or "").upper()
+    conf = e.get("confidence") or e.get("score")
+    cam = e.get("camera") or e.get("camera_name") or e.get("source")
+    loc = e.get("location") or e.get("site") or e.get("zone")
+    
+    # معلومات المركبة
+    vehicle = e.get("vehicle", {})
+    if not isinstance(vehicle, dict):
+        vehicle = {}
+    
+    make = vehicle.get("make")
+    model = vehicle.get("model")
+    color = vehicle.get("color")
+    
+    direction = e.get("direction") or e.get("event_type")
+    img_url = e.get("image_url") or e.get("snapshot") or e.get("thumbnail")
+    # المعرف الذي أرسله الـ API (قد يكون 0)؛ None إذا لم يُرسل
+    source_id = e.get("id") if e.get("id") is not None else e.get("uuid")
+    event_id = source_id if source_id is not None else f"{plate}-{int(time.time()*1000)}"
+    
+    return {
+        "event_id": event_id,
+        "source_id": source_id,
+        "timestamp_ast": ts,
+        "timestamp_formatted": format_datetime(ts),
+        "timestamp_raw": e.get("timestamp") or e.get("time"),
+        "plate": plate,
+        "confidence": conf,
+        "confidence_formatted": format_confidence(conf),
+        "camera": cam,
+        "direction": direction,
+        "location": loc,
+        "make": make,
+        "model": model,
+        "color": color,
+        "image_url": img_url,
+        "image_path": None,
+        "thumbnail_path": None,
+    }
+
+def iter_events():
+    """الأحداث المطبّعة كمولّد (مع حذف المكرر على حدود النوافذ حسب معرف الـ API)"""
+    seen = set()
+    for raw in iter_raw_events():
+        event = normalize_event(raw)
+        source_id = event["source_id"]
+        if source_id is not None:
+            if source_id in seen:
+                continue
+            seen.add(source_id)
+        yield event
+
+def fetch_events():
+    """جلب الأحداث من API"""
+    print("🔄 جلب البيانات من ParkPow...")
+    
+    normalized = list(iter_events())
     
     print(f"✅ تم جلب {len(normalized)} حدث")
     return normalized
@@ -166,81 +276,371 @@ def fetch_events():
 # تحميل الصور - Image Download
 # ========================================
 
-def path_for(event_id, suffix="jpg"):
-    """إنشاء مسار للصورة"""
-    dt = datetime.now(AST)
-    sub = f"{dt.year}/{dt.month:02d}/{dt.day:02d}"
-    base = pathlib.Path(CONFIG["img_dir"]) / sub
-    base.mkdir(parents=True, exist_ok=True)
-    return str(base / f"{event_id}.{suffix}")
+class ImageCache:
+    """
+    ذاكرة دائمة للصور معنونة بالمفتاح (معرف الحدث من الـ API أو الرابط) مع فهرس manifest.json
+    
+    تُعاد الصور والمصغرات المحملة سابقاً في التشغيلات التالية بدلاً من تحميلها من جديد،
+    ويُحذف الأقدم استخداماً (LRU) عند تجاوز الحجم المسموح
+    """
+    
+    def __init__(self, root, max_bytes):
+        self.root = pathlib.Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        # مجلدات فرعية حسب أول خانتين من المفتاح (تُنشأ مرة واحدة)
+        for prefix in range(256):
+            (self.root / f"{prefix:02x}").mkdir(exist_ok=True)
+        self.manifest_path = self.root / "manifest.json"
+        self.max_bytes = max_bytes
+        self.run_started = time.time()
+        self.hits = 0
+        self._lock = threading.Lock()
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+    
+    @staticmethod
+    def key_for(event_id, url=None):
+        """
+        مفتاح ثابت عبر التشغيلات: معرف الحدث من الـ API أولاً لأن روابط الصور قد تتغير،
+        والرابط إذا لم يرسل الـ API معرفاً (المعرفات المولدة محلياً تتغير في كل تشغيل)
+        """
+        return hashlib.sha256(str(event_id if event_id is not None else url).encode("utf-8")).hexdigest()
+    
+    def paths(self, key):
+        """مسارا الصورة الكاملة والمصغرة لمفتاح"""
+        base = self.root / key[:2]
+        return str(base / f"{key}.jpg"), str(base / f"{key}_thumb.jpg")
+    
+    def lookup(self, key):
+        """إرجاع (الصورة، المصغرة) المخزنة أو None لما هو غير موجود"""
+        image, thumb = self.paths(key)
+        with self._lock:
+            entry = self.entries.get(key)
+            if not entry or not os.path.exists(image):
+                return None, None
+            entry["last_used"] = time.time()
+            self.hits += 1
+            if not (entry.get("thumbnail") and os.path.exists(thumb)):
+                thumb = None
+        return image, thumb
+    
+    def store(self, key, event_id=None, url=None, thumbnail=False):
+        """تسجيل صورة (ومصغرتها) في الفهرس"""
+        image, thumb = self.paths(key)
+        size = os.path.getsize(image)
+        if thumbnail and os.path.exists(thumb):
+            size += os.path.getsize(thumb)
+        with self._lock:
+            entry = self.entries.setdefault(key, {})
+            entry.update({
+                "event_id": event_id or entry.get("event_id"),
+                "url": url or entry.get("url"),
+                "thumbnail": bool(thumbnail or entry.get("thumbnail")),
+                "size": size,
+                "last_used": time.time(),
+            })
+    
+    def evict(self):
+        """حذف الأقدم استخداماً حتى يعود الحجم ضمن الحد (دون حذف صور التشغيل الحالي)"""
+        total = sum(entry.get("size", 0) for entry in self.entries.values())
+        removed = 0
+        for key, entry in sorted(self.entries.items(), key=lambda kv: kv[1].get("last_used", 0)):
+            if total <= self.max_bytes or entry.get("last_used", 0) >= self.run_started:
+                break
+            for path in self.paths(key):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= entry.get("size", 0)
+            del self.entries[key]
+            removed += 1
+        return removed
+    
+    def save(self):
+        """حفظ الفهرس (كتابة ذرية)"""
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+_image_caches = {}
+_image_caches_lock = threading.Lock()
+
+def image_cache():
+    """
+    ذاكرة الصور المشتركة لمجلد الصور الحالي (تُنشأ مرة واحدة لكل مجلد وتُحفظ عند الخروج)
+    """
+    key = (CONFIG["img_dir"], CONFIG["image_cache_max_mb"])
+    with _image_caches_lock:
+        cache = _image_caches.get(key)
+        if cache is None:
+            cache = ImageCache(CONFIG["img_dir"], CONFIG["image_cache_max_mb"] * 1024 * 1024)
+            atexit.register(cache.save)
+            _image_caches[key] = cache
+        return cache
+
+_session = None
+_session_lock = threading.Lock()
+_host_limits = {}
+
+def http_session():
+    """جلسة HTTP مشتركة تعيد استخدام الاتصالات بين التحميلات"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            pool = max(CONFIG["download_workers"], CONFIG["per_host_limit"])
+            adapter = HTTPAdapter(pool_connections=pool, pool_maxsize=pool)
+            _session = requests.Session()
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+            _session.headers.update(auth_headers())
+        return _session
+
+def host_limit(url):
+    """حد التحميلات المتزامنة لكل خادم"""
+    host = urlsplit(url).netloc
+    with _session_lock:
+        if host not in _host_limits:
+            _host_limits[host] = threading.BoundedSemaphore(CONFIG["per_host_limit"])
+        return _host_limits[host]
 
-def download_image(url, event_id):
-    """تحميل الصورة وإنشاء صورة مصغرة"""
+def fetch_image(url, out_path):
+    """تحميل الصورة إلى الذاكرة وكتابتها على القرص مرة واحدة، وإرجاع محتواها"""
+    with host_limit(url):
+        resp = http_session().get(url, timeout=30)
+        resp.raise_for_status()
+        data = resp.content
+    with open(out_path, "wb") as f:
+        f.write(data)
+    return data
+
+def make_thumbnail(source, thumb_path):
+    """
+    إنشاء صورة مصغرة (تعمل في عملية منفصلة)
+    
+    تقبل محتوى الصورة (bytes) مباشرة دون إعادة قراءتها من القرص، أو مساراً؛
+    ومع JPEG تستخدم draft() لفك الترميز بدقة مصغرة بدلاً من الدقة الكاملة
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with Image.open(source) as img:
+        img.draft("RGB", (320, 320))
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.thumbnail((320, 320))
+        img.save(thumb_path, "JPEG", quality=85)
+    return thumb_path
+
+def download_image(url, event_id, cache=None, source_id=None):
+    """
+    تحميل الصورة وإنشاء صورة مصغرة
+    
+    المفتاح كما في iter_attached: source_id (معرف الـ API، event["source_id"]) أو الرابط
+    إذا لم يوجد؛ event_id للرسائل والفهرس فقط. بدون cache تُستخدم الذاكرة المشتركة
+    """
     if not url:
         return None, None
     
-    out_path = path_for(event_id, "jpg")
+    cache = cache or image_cache()
+    key = cache.key_for(source_id, url)
+    out_path, thumb_path = cache.paths(key)
     
     try:
-        # تحميل الصورة
-        with requests.get(url, headers=auth_headers(), stream=True, timeout=30) as resp:
-            resp.raise_for_status()
-            with open(out_path, "wb") as f:
-                shutil.copyfileobj(resp.raw, f)
+        cached, cached_thumb = cache.lookup(key)
+        if cached and cached_thumb:
+            return cached, cached_thumb
+        
+        # تحميل الصورة (أو استخدام المخزنة)
+        data = out_path if cached else fetch_image(url, out_path)
         
-        # إنشاء صورة مصغرة
-        thumb_path = path_for(event_id + "_thumb", "jpg")
-        with Image.open(out_path) as img:
-            img.thumbnail((320, 320))
-            img.save(thumb_path, "JPEG", quality=85)
+        # إنشاء صورة مصغرة من نفس المحتوى
+        make_thumbnail(data, thumb_path)
+        cache.store(key, event_id, url, thumbnail=True)
         
         return out_path, thumb_path
     except Exception as e:
         print(f"⚠️ خطأ في تحميل الصورة {event_id}: {e}")
         return None, None
 
-def attach_images(events):
-    """إرفاق الصور بالأحداث"""
+def _download_only(e, cache):
+    """تحميل صورة حدث واحد (في خيط)"""
+    key = cache.key_for(e.get("source_id"), e["image_url"])
+    out_path, _ = cache.paths(key)
+    try:
+        data = fetch_image(e["image_url"], out_path)
+        cache.store(key, e["event_id"], e["image_url"])
+        return out_path, data
+    except Exception as exc:
+        print(f"⚠️ خطأ في تحميل الصورة {e['event_id']}: {exc}")
+        return None, None
+
+def _attach_batch(events, cache, thumbs_pool):
+    """إرفاق الصور بمجموعة أحداث باستخدام ذاكرة ومجموعة عمليات مشتركة"""
+    pending = []
+    needs_thumb = []
+    hits_before = cache.hits
+    for e in events:
+        e["image_path"] = None
+        e["thumbnail_path"] = None
+        if not e.get("image_url"):
+            continue
+        key = cache.key_for(e.get("source_id"), e["image_url"])
+        e["image_path"], e["thumbnail_path"] = cache.lookup(key)
+        if not e["image_path"]:
+            pending.append(e)
+        elif not e["thumbnail_path"]:
+            needs_thumb.append(e)
+    total = len(pending)
+    if cache.hits > hits_before:
+        print(f"  ♻️ من الذاكرة: {cache.hits - hits_before} صورة")
+    
+    # حد للصور المنتظرة للتصغير حتى لا تتراكم محتوياتها في الذاكرة
+    max_pending_thumbs = 2 * max(1, CONFIG["thumbnail_workers"], CONFIG["download_workers"])
+    thumb_futures = {}
+    
+    def collect(done):
+        for future in done:
+            e = thumb_futures.pop(future)
+            try:
+                e["thumbnail_path"] = future.result()
+                cache.store(cache.key_for(e.get("source_id"), e["image_url"]), thumbnail=True)
+            except Exception as exc:
+                print(f"⚠️ خطأ في إنشاء الصورة المصغرة {e['event_id']}: {exc}")
+    
+    with ThreadPoolExecutor(max(1, CONFIG["download_workers"])) as downloads:
+        pool = thumbs_pool or downloads
+        
+        # صور مخزنة بلا مصغرة: التصغير من الملف الموجود
+        for e in needs_thumb:
+            _, thumb_path = cache.paths(cache.key_for(e.get("source_id"), e["image_url"]))
+            thumb_futures[pool.submit(make_thumbnail, e["image_path"], thumb_path)] = e
+        
+        futures = {downloads.submit(_download_only, e, cache): e for e in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            e = futures.pop(future)
+            full, data = future.result()
+            print(f"  [{done}/{total}] {e['event_id']}")
+            if not full:
+                continue
+            e["image_path"] = full
+            
+            if len(thumb_futures) >= max_pending_thumbs:
+                finished, _ = wait(thumb_futures, return_when=FIRST_COMPLETED)
+                collect(finished)
+            
+            # التصغير من المحتوى المحمّل نفسه دون إعادة القراءة من القرص
+            _, thumb_path = cache.paths(cache.key_for(e.get("source_id"), e["image_url"]))
+            thumb_futures[pool.submit(make_thumbnail, data, thumb_path)] = e
+        
+        collect(list(as_completed(thumb_futures)))
+
+def iter_attached(events, batch_size=None):
+    """
+    إرفاق الصور بالأحداث كمولّد: تُعالج الأحداث على دفعات من batch_size
+    (افتراضياً CONFIG["image_batch_size"]) وتُمرر كل دفعة فور اكتمال صورها،
+    فلا يبقى في الذاكرة إلا دفعة واحدة
+    
+    الصور الموجودة في الذاكرة الدائمة تُستخدم مباشرة؛ والباقي يُحمّل في مجموعة خيوط
+    محدودة (مع حد لكل خادم وإعادة استخدام الاتصالات)، والصور المصغرة في مجموعة
+    عمليات منفصلة تبدأ فور اكتمال كل تحميل
+    """
     print("🔄 تحميل الصور...")
     
-    for i, e in enumerate(events, 1):
-        print(f"  [{i}/{len(events)}] {e['event_id']}")
-        full, thumb = download_image(e["image_url"], e["event_id"])
-        e["image_path"] = full
-        e["thumbnail_path"] = thumb
+    batch_size = batch_size or CONFIG["image_batch_size"]
+    cache = image_cache()
+    thumbs_pool = ProcessPoolExecutor(CONFIG["thumbnail_workers"]) if CONFIG["thumbnail_workers"] > 0 else None
+    events = iter(events)
+    try:
+        while True:
+            batch = list(itertools.islice(events, batch_size))
+            if not batch:
+                break
+            _attach_batch(batch, cache, thumbs_pool)
+            cache.save()
+            yield from batch
+    finally:
+        if thumbs_pool:
+            thumbs_pool.shutdown()
+        removed = cache.evict()
+        cache.save()
+        if removed:
+            print(f"  🧹 حذف {removed} صورة قديمة من الذاكرة")
     
     print("✅ تم تحميل الصور")
+
+def attach_images(events):
+    """إرفاق الصور بقائمة أحداث دفعة واحدة (انظر iter_attached)"""
+    for _ in iter_attached(events, batch_size=max(1, len(events))):
+        pass
     return events
 
+def spool_events(events, path):
+    """
+    كتابة الأحداث إلى ملف JSONL مؤقت سطراً سطراً وإرجاع عددها؛
+    تقرأ منه المصدّرات كلٌّ بدوره عبر iter_spool دون إبقاء الأحداث في الذاكرة
+    """
+    count = 0
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for e in events:
+            f.write(json.dumps(e, ensure_ascii=False, default=lambda v: v.isoformat()))
+            f.write("\n")
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+def iter_spool(path):
+    """قراءة الأحداث من ملف spool_events كمولّد"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            e = json.loads(line)
+            if e.get("timestamp_ast"):
+                e["timestamp_ast"] = datetime.fromisoformat(e["timestamp_ast"])
+            yield e
+
 # ========================================
 # تصدير Excel - Excel Export
 # ========================================
 
+EXCEL_COLUMNS = [
+    ("event_id", "المعرف"),
+    ("timestamp_formatted", "التاريخ والوقت"),
+    ("plate", "اللوحة"),
+    ("confidence_formatted", "الثقة"),
+    ("camera", "الكاميرا"),
+    ("direction", "الاتجاه"),
+    ("location", "الموقع"),
+    ("make", "الماركة"),
+    ("model", "الموديل"),
+    ("color", "اللون"),
+]
+
+EXCEL_IMAGE_COLUMNS = ["event_id", "timestamp_formatted", "plate", "confidence_formatted", "camera", "location"]
+
+def is_low_confidence(conf, threshold=0.8):
+    """هل الثقة أقل من الحد"""
+    try:
+        return bool(conf) and float(conf) < threshold
+    except (TypeError, ValueError):
+        return False
+
 def export_excel(events, filename="parkpow_events.xlsx"):
-    """تصدير البيانات إلى Excel مع الصور"""
+    """
+    تصدير البيانات إلى Excel مع الصور
+    
+    يكتب الصفوف تدفقياً فور وصولها (events قائمة أو مولّد) بوضع constant_memory في
+    xlsxwriter، وتُحسب أرقام جودة البيانات أثناء الكتابة
+    """
     print("🔄 إنشاء ملف Excel...")
     
     xls_path = os.path.join(CONFIG["out_dir"], filename)
-    df = pd.DataFrame(events)
+    wb = xlsxwriter.Workbook(xls_path, {"constant_memory": True})
     
-    # اختيار الأعمدة للعرض
-    display_columns = [
-        "event_id", "timestamp_formatted", "plate", "confidence_formatted",
-        "camera", "direction", "location", "make", "model", "color"
-    ]
-    
-    df_display = df[display_columns].copy()
-    df_display.columns = [
-        "المعرف", "التاريخ والوقت", "اللوحة", "الثقة",
-        "الكاميرا", "الاتجاه", "الموقع", "الماركة", "الموديل", "اللون"
-    ]
-    
-    with pd.ExcelWriter(xls_path, engine="xlsxwriter") as writer:
-        # ورقة البيانات الأساسية
-        df_display.to_excel(writer, sheet_name="الأحداث", index=False)
-        wb = writer.book
-        ws = writer.sheets["الأحداث"]
-        
+    try:
         # تنسيق الرأس
         header_fmt = wb.add_format({
             "bold": True,
@@ -250,43 +650,45 @@ def export_excel(events, filename="parkpow_events.xlsx"):
             "valign": "vcenter"
         })
         
-        for col_num in range(len(df_display.columns)):
-            ws.set_row(0, 25, header_fmt)
-            ws.set_column(col_num, col_num, 20)
+        # ورقة البيانات الأساسية
+        ws = wb.add_worksheet("الأحداث")
+        ws.set_row(0, 25, header_fmt)
+        ws.set_column(0, len(EXCEL_COLUMNS) - 1, 20)
+        for i, (_, header) in enumerate(EXCEL_COLUMNS):
+            ws.write(0, i, header, header_fmt)
         
         # ورقة مع الصور المصغرة
         ws2 = wb.add_worksheet("الأحداث مع الصور")
+        ws2.set_column(0, len(EXCEL_IMAGE_COLUMNS) - 1, 18)
+        for i, column in enumerate(EXCEL_IMAGE_COLUMNS):
+            ws2.write(0, i, dict(EXCEL_COLUMNS)[column], header_fmt)
         
-        columns = [
-            "event_id", "timestamp_formatted", "plate", "confidence_formatted",
-            "camera", "location"
-        ]
-        headers = ["المعرف", "التاريخ والوقت", "اللوحة", "الثقة", "الكاميرا", "الموقع"]
-        
-        for i, h in enumerate(headers):
-            ws2.write(0, i, h, header_fmt)
-            ws2.set_column(i, i, 18)
+        # ورقة جودة البيانات
+        ws3 = wb.add_worksheet("جودة البيانات")
         
         # كتابة البيانات والصور
+        total = missing_img = low_conf = 0
         for idx, e in enumerate(events, start=1):
-            for i, c in enumerate(columns):
-                ws2.write(idx, i, e.get(c, ""))
+            total += 1
+            missing_img += not e.get("image_path")
+            low_conf += is_low_confidence(e.get("confidence"))
             
-            if e.get("thumbnail_path") and os.path.exists(e["thumbnail_path"]):
+            for i, (column, _) in enumerate(EXCEL_COLUMNS):
+                ws.write(idx, i, e.get(column))
+            
+            thumb = e.get("thumbnail_path")
+            has_thumb = bool(thumb) and os.path.exists(thumb)
+            if has_thumb:
                 ws2.set_row(idx, 80)
+            for i, column in enumerate(EXCEL_IMAGE_COLUMNS):
+                ws2.write(idx, i, e.get(column, ""))
+            if has_thumb:
                 ws2.insert_image(
-                    idx, len(columns),
-                    e["thumbnail_path"],
+                    idx, len(EXCEL_IMAGE_COLUMNS),
+                    thumb,
                     {"x_scale": 0.7, "y_scale": 0.7}
                 )
         
-        # ورقة جودة البيانات
-        ws3 = wb.add_worksheet("جودة البيانات")
-        
-        total = len(events)
-        missing_img = sum(1 for e in events if not e.get("image_path"))
-        low_conf = sum(1 for e in events if e.get("confidence") and float(e["confidence"]) < 0.8)
-        
         ws3.write(0, 0, "إجمالي الأحداث", header_fmt)
         ws3.write(0, 1, total)
         ws3.write(1, 0, "الصور المفقودة", header_fmt)
@@ -296,6 +698,8 @@ def export_excel(events, filename="parkpow_events.xlsx"):
         
         ws3.set_column(0, 0, 25)
         ws3.set_column(1, 1, 15)
+    finally:
+        wb.close()
     
     print(f"✅ تم إنشاء ملف Excel: {xls_path}")
     return xls_path
@@ -427,6 +831,14 @@ body {
     transform: translateY(-2px);
     box-shadow: var(--shadow-xl);
 }
+
+.pagination {
+    display: flex;
+    justify-content: center;
+    gap: var(--spacing-md);
+    margin: var(--spacing-lg) 0;
+    font-weight: var(--font-weight-bold);
+}
 </style>
 </head>
 <body>
@@ -441,10 +853,26 @@ body {
         <div><strong>من:</strong> {{ date_from }}</div>
         <div><strong>إلى:</strong> {{ date_to }}</div>
         <div><strong>تاريخ الإنشاء:</strong> {{ generated_at }}</div>
+        {% if total_events is not none %}
         <div><strong>عدد الأحداث:</strong> {{ total_events }}</div>
+        {% endif %}
+        {% if pagination %}
+        <div><strong>الصفحة:</strong> {{ pagination.number }} ({{ pagination.first }} - {{ pagination.last }})</div>
+        {% endif %}
     </div>
 </div>
 
+{% macro page_nav() %}
+{% if pagination %}
+<nav class="pagination no-print">
+    {% if pagination.prev %}<a href="{{ pagination.prev }}">→ السابق</a>{% endif %}
+    <a href="{{ pagination.index }}">الفهرس</a>
+    {% if pagination.next %}<a href="{{ pagination.next }}">التالي ←</a>{% endif %}
+</nav>
+{% endif %}
+{% endmacro %}
+{{ page_nav() }}
+
 <table class="report-table">
 <thead>
 <tr>
@@ -476,7 +904,7 @@ body {
     <td>{{ e.color }}</td>
     <td>
         {% if e.thumbnail_path %}
-        <img class="thumb" src="{{ e.thumbnail_path }}" alt="صورة المركبة">
+        <img class="thumb" src="{{ e.thumbnail_src }}" loading="lazy" decoding="async" alt="صورة المركبة">
         {% else %}
         <span style="color: #999;">لا توجد صورة</span>
         {% endif %}
@@ -486,6 +914,9 @@ body {
 </tbody>
 </table>
 
+{{ page_nav() }}
+
+{% if not pagination or not pagination.next %}
 <div class="signature-section">
     <div class="signature-box">
         <div>إعداد: _________________________</div>
@@ -496,6 +927,7 @@ body {
         <div style="margin-top: 10px; font-size: 12px; color: #666;">التوقيع والختم</div>
     </div>
 </div>
+{% endif %}
 
 <div class="footer-note">
     <strong>ملاحظة:</strong> هذا التقرير تقني ويُستخدم لأغراض التوثيق والشفافية المؤسسية.
@@ -508,57 +940,294 @@ body {
 </html>
 """
 
-def export_html(events, filename="parkpow_events.html"):
-    """تصدير البيانات إلى HTML"""
-    print("🔄 إنشاء ملف HTML...")
+HTML_INDEX_TEMPLATE = """
+<!DOCTYPE html>
+<html lang="ar" dir="rtl">
+<head>
+<meta charset="utf-8">
+<title>فهرس تقرير المركبات - ParkPow</title>
+<link rel="stylesheet" href="../../css/brand-identity.css">
+<style>
+body { font-family: var(--font-family); padding: 20px; }
+table { width: 100%; border-collapse: collapse; }
+th { background: var(--gradient-primary); color: var(--primary-white); padding: 10px; }
+td { border: 1px solid var(--neutral-200); padding: 8px; text-align: center; }
+</style>
+</head>
+<body>
+<h1>📋 تقرير المركبات - ParkPow</h1>
+<p><strong>الجهة:</strong> {{ organization }} - {{ department }}</p>
+<p><strong>من:</strong> {{ date_from }} <strong>إلى:</strong> {{ date_to }}</p>
+<p><strong>تاريخ الإنشاء:</strong> {{ generated_at }} - <strong>عدد الأحداث:</strong> {{ total_events }}</p>
+<table>
+<thead>
+<tr><th>الصفحة</th><th>من</th><th>إلى</th><th>عدد الأحداث</th></tr>
+</thead>
+<tbody>
+{% for page in pages %}
+<tr>
+    <td><a href="{{ page.href }}">{{ page.number }}</a></td>
+    <td>{{ page.first }}</td>
+    <td>{{ page.last }}</td>
+    <td>{{ page.count }}</td>
+</tr>
+{% endfor %}
+</tbody>
+</table>
+</body>
+</html>
+"""
+
+register_template("parkpow_events.html", HTML_TEMPLATE)
+register_template("parkpow_events_index.html", HTML_INDEX_TEMPLATE)
+
+def html_rows(events, base_dir):
+    """الأحداث مع مسار الصورة المصغرة نسبةً إلى ملف HTML"""
+    for e in events:
+        thumb = e.get("thumbnail_path")
+        yield {**e, "thumbnail_src": os.path.relpath(thumb, base_dir).replace(os.sep, "/") if thumb else None}
+
+def export_html(events, filename="parkpow_events.html", page_size=None):
+    """
+    تصدير البيانات إلى HTML
     
-    html_path = os.path.join(CONFIG["out_dir"], filename)
-    tmpl = Template(HTML_TEMPLATE)
+    يُكتب القالب تدفقياً إلى الملف؛ ومع page_size (افتراضياً CONFIG["html_page_size"])
+    تُقسّم الأحداث إلى صفحات من page_size صفاً ويصبح filename صفحة فهرس لها
+    """
+    print("🔄 إنشاء ملف HTML...")
     
-    html = tmpl.render(
-        events=events,
+    out_dir = CONFIG["out_dir"]
+    html_path = os.path.join(out_dir, filename)
+    page_size = CONFIG["html_page_size"] if page_size is None else page_size
+    context = dict(
         organization=CONFIG["organization"],
         department=CONFIG["department"],
         date_from=CONFIG["date_from"],
         date_to=CONFIG["date_to"],
         generated_at=datetime.now(AST).strftime("%Y-%m-%d %H:%M"),
-        total_events=len(events)
     )
     
-    with open(html_path, "w", encoding="utf-8") as f:
-        f.write(html)
+    if page_size <= 0:
+        render_to_file(
+            "parkpow_events.html", html_path,
+            events=html_rows(events, out_dir),
+            total_events=len(events) if hasattr(events, "__len__") else None,
+            pagination=None,
+            **context
+        )
+        print(f"✅ تم إنشاء ملف HTML: {html_path}")
+        return html_path
+    
+    stem = os.path.splitext(filename)[0]
+    page_name = lambda n: f"{stem}_p{n}.html"
+    rows = html_rows(events, out_dir)
+    pages = []
     
-    print(f"✅ تم إنشاء ملف HTML: {html_path}")
+    # قراءة صفحة واحدة مسبقاً لمعرفة وجود صفحة تالية
+    chunk = list(itertools.islice(rows, page_size))
+    number = 1
+    while chunk:
+        following = list(itertools.islice(rows, page_size))
+        pagination = {
+            "number": number,
+            "first": chunk[0].get("timestamp_formatted"),
+            "last": chunk[-1].get("timestamp_formatted"),
+            "prev": page_name(number - 1) if number > 1 else None,
+            "next": page_name(number + 1) if following else None,
+            "index": filename,
+        }
+        render_to_file("parkpow_events.html", os.path.join(out_dir, page_name(number)),
+                       events=chunk, total_events=None, pagination=pagination, **context)
+        pages.append({**pagination, "href": page_name(number), "count": len(chunk)})
+        chunk, number = following, number + 1
+    
+    render_to_file(
+        "parkpow_events_index.html", html_path,
+        pages=pages,
+        total_events=sum(page["count"] for page in pages),
+        **context
+    )
+    
+    print(f"✅ تم إنشاء ملف HTML: {html_path} ({len(pages)} صفحة)")
     return html_path
 
 # ========================================
 # تصدير PDF - PDF Export
 # ========================================
 
-def export_pdf(html_path, filename="parkpow_events.pdf"):
-    """تحويل HTML إلى PDF"""
+# المسارات النسبية تُحسب من جذر المستودع لا من مجلد التشغيل
+PDF_FONT_CANDIDATES = [
+    os.path.join(REPO_ROOT, "assets", "fonts", "Tajawal-Regular.ttf"),
+    "/usr/share/fonts/truetype/noto/NotoNaskhArabic-Regular.ttf",
+    "/usr/share/fonts/opentype/noto/NotoNaskhArabic-Regular.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "C:/Windows/Fonts/arial.ttf",
+]
+
+def find_pdf_font():
+    """البحث عن خط TTF يدعم العربية (PARKPOW_PDF_FONT أولاً)"""
+    if CONFIG["pdf_font"]:
+        if os.path.exists(CONFIG["pdf_font"]):
+            return CONFIG["pdf_font"]
+        raise ExportError(f"خط PDF غير موجود: PARKPOW_PDF_FONT={CONFIG['pdf_font']}")
+    for path in PDF_FONT_CANDIDATES:
+        if os.path.exists(path):
+            return path
+    raise ExportError(
+        "لم يتم العثور على خط عربي لملف PDF؛ حدد PARKPOW_PDF_FONT أو ضع الخط في "
+        + PDF_FONT_CANDIDATES[0]
+    )
+
+class EventsPDF(FPDF):
+    """
+    تقرير PDF للأحداث (عربي، من اليمين لليسار)
+    
+    تُضاف الصفوف صفحة بعد صفحة فور وصول الأحداث؛ وكل صورة مصغرة تُضمّن في الملف
+    مرة واحدة ويُشار إليها في كل استخدام (FPDF يعيد استخدام الصورة لنفس المسار)
+    """
+    
+    # (الحقل، العنوان، العرض بالملم) بالترتيب من اليمين
+    COLUMNS = [
+        ("event_id", "المعرف", 34),
+        ("timestamp_formatted", "التاريخ والوقت", 36),
+        ("plate", "اللوحة", 28),
+        ("confidence_formatted", "الثقة", 18),
+        ("camera", "الكاميرا", 30),
+        ("direction", "الاتجاه", 22),
+        ("location", "الموقع", 32),
+        ("thumbnail_path", "الصورة", 47),
+    ]
+    ROW_HEIGHT = 8
+    IMAGE_ROW_HEIGHT = 24
+    
+    def __init__(self, font_path, meta):
+        super().__init__(orientation="L", format="A4")
+        self.meta = meta
+        self.set_margins(15, 12, 15)
+        self.set_auto_page_break(False)
+        self.add_font("report", "", font_path)
+        self.set_font("report", size=9)
+        self._fitted = {}
+        self.shaping = False
+        try:
+            # تشكيل الحروف العربية واتجاه RTL (يتطلب uharfbuzz)
+            self.set_text_shaping(True)
+            self.shaping = True
+        except Exception as e:
+            print(f"⚠️ تشكيل النص العربي غير متاح ({e})")
+    
+    def _fit(self, text, width):
+        """قص النص ليناسب عرض الخلية (مع حفظ النتيجة للقيم المتكررة)"""
+        text = "" if text is None else str(text)
+        key = (text, width, self.font_size_pt)
+        if key not in self._fitted:
+            fitted = text
+            while fitted and self.get_string_width(fitted) > width - 2:
+                fitted = fitted[:-1]
+            self._fitted[key] = fitted
+        return self._fitted[key]
+    
+    def _cell(self, width, height, text, **kwargs):
+        """خلية نصية؛ التشكيل يُفعّل فقط للنصوص غير اللاتينية لأنه الأعلى تكلفة"""
+        if self.shaping and text.isascii():
+            self.set_text_shaping(False)
+            self.cell(width, height, text, **kwargs)
+            self.set_text_shaping(True)
+        else:
+            self.cell(width, height, text, **kwargs)
+    
+    def _row(self, values, height, fill=False):
+        """رسم صف من اليمين إلى اليسار"""
+        x = self.w - self.r_margin
+        y = self.get_y()
+        for (key, _, width), value in zip(self.COLUMNS, values):
+            x -= width
+            self.set_xy(x, y)
+            if key == "thumbnail_path" and not fill:
+                self.rect(x, y, width, height)
+                if value and os.path.exists(value):
+                    self.image(value, x=x + 1, y=y + 1, w=width - 2, h=height - 2, keep_aspect_ratio=True)
+                else:
+                    self.set_xy(x, y)
+                    self.cell(width, height, "لا توجد صورة", border=0, align="C")
+            else:
+                self._cell(width, height, self._fit(value, width), border=1, align="C", fill=fill)
+        self.set_xy(self.l_margin, y + height)
+    
+    def header(self):
+        """رأس الصفحة: العنوان وبيانات التقرير ورأس الجدول"""
+        self.set_font("report", size=16)
+        self.cell(0, 10, "تقرير المركبات - ParkPow", align="C", new_x="LMARGIN", new_y="NEXT")
+        self.set_font("report", size=9)
+        meta = self.meta
+        line = f"الجهة: {meta['organization']}    القسم: {meta['department']}    من: {meta['date_from']}    إلى: {meta['date_to']}"
+        self.cell(0, 6, line, align="C", new_x="LMARGIN", new_y="NEXT")
+        self.ln(2)
+        self.set_fill_color(70, 130, 180)
+        self.set_text_color(255, 255, 255)
+        self._row([title for _, title, _ in self.COLUMNS], self.ROW_HEIGHT, fill=True)
+        self.set_text_color(0, 0, 0)
+    
+    def footer(self):
+        """تذييل الصفحة"""
+        self.set_y(-12)
+        self.set_font("report", size=8)
+        self.cell(0, 8, f"{self.meta['organization']} - صفحة {self.page_no()}", align="C")
+    
+    def add_event(self, e):
+        """إضافة حدث كصف في الجدول (صفحة جديدة عند الامتلاء)"""
+        thumb = e.get("thumbnail_path")
+        height = self.IMAGE_ROW_HEIGHT if thumb else self.ROW_HEIGHT
+        if self.get_y() + height > self.h - 15:
+            self.add_page()
+        self._row([e.get(key) for key, _, _ in self.COLUMNS], height)
+    
+    def add_signatures(self, total):
+        """قسم الإجمالي والتوقيعات"""
+        if self.get_y() + 40 > self.h - 15:
+            self.add_page()
+        self.ln(6)
+        self.cell(0, 8, f"عدد الأحداث: {total}    تاريخ الإنشاء: {self.meta['generated_at']}",
+                  align="R", new_x="LMARGIN", new_y="NEXT")
+        self.ln(10)
+        half = (self.w - self.l_margin - self.r_margin) / 2
+        self.cell(half, 8, "اعتماد: _________________________  (التوقيع والختم)", align="C")
+        self.cell(half, 8, "إعداد: _________________________  (التوقيع والتاريخ)", align="C",
+                  new_x="LMARGIN", new_y="NEXT")
+
+def export_pdf(events, filename="parkpow_events.pdf"):
+    """
+    تصدير البيانات إلى PDF مباشرة (بدون wkhtmltopdf)
+    
+    يحتاج خطاً عربياً TTF: PARKPOW_PDF_FONT أو أحد PDF_FONT_CANDIDATES؛
+    ويُرفع ExportError إذا لم يوجد الخط أو فشل الإنشاء
+    """
     print("🔄 إنشاء ملف PDF...")
     
     pdf_path = os.path.join(CONFIG["out_dir"], filename)
+    font_path = find_pdf_font()
     
     try:
-        # استخدام wkhtmltopdf إذا كان متوفراً
-        subprocess.run([
-            "wkhtmltopdf",
-            "--encoding", "utf-8",
-            "--enable-local-file-access",
-            html_path,
-            pdf_path
-        ], check=True)
+        pdf = EventsPDF(font_path, {
+            "organization": CONFIG["organization"],
+            "department": CONFIG["department"],
+            "date_from": CONFIG["date_from"],
+            "date_to": CONFIG["date_to"],
+            "generated_at": datetime.now(AST).strftime("%Y-%m-%d %H:%M"),
+        })
+        pdf.add_page()
+        total = 0
+        for e in events:
+            pdf.add_event(e)
+            total += 1
+        pdf.add_signatures(total)
+        pdf.output(pdf_path)
         
         print(f"✅ تم إنشاء ملف PDF: {pdf_path}")
         return pdf_path
-    except FileNotFoundError:
-        print("⚠️ wkhtmltopdf غير متوفر، استخدم HTML للطباعة")
-        return None
     except Exception as e:
-        print(f"❌ خطأ في إنشاء PDF: {e}")
-        return None
+        raise ExportError(f"خطأ في إنشاء PDF: {e}") from e
 
 # ========================================
 # التنفيذ الرئيسي - Main Execution
@@ -580,36 +1249,47 @@ def run(date_from=None, date_to=None, site=None, camera=None):
     if camera:
         CONFIG["camera"] = camera
     
-    # جلب البيانات
-    events = fetch_events()
-    
-    if not events:
-        print("⚠️ لا توجد أحداث للتصدير")
-        return None
-    
-    # تحميل الصور
-    events = attach_images(events)
-    
-    # التصدير
-    xls = export_excel(events)
-    html = export_html(events)
-    pdf = export_pdf(html)
+    # الجلب وتحميل الصور تدفقياً إلى ملف مؤقت، ثم يقرأ كل مصدّر الأحداث منه بدوره
+    # فلا تُحمّل الأحداث كاملة في الذاكرة
+    spool_path = os.path.join(CONFIG["out_dir"], ".parkpow_events.jsonl")
+    try:
+        print("🔄 جلب البيانات من ParkPow...")
+        count = spool_events(iter_attached(iter_events()), spool_path)
+        print(f"✅ تم جلب {count} حدث")
+        
+        if not count:
+            print("⚠️ لا توجد أحداث للتصدير")
+            return None
+        
+        # التصدير
+        xls = export_excel(iter_spool(spool_path))
+        html = export_html(iter_spool(spool_path))
+        pdf = export_pdf(iter_spool(spool_path))
+    except (FetchError, ExportError) as e:
+        print(f"❌ التصدير غير مكتمل: {e}")
+        raise
+    finally:
+        for path in (spool_path, f"{spool_path}.tmp"):
+            if os.path.exists(path):
+                os.remove(path)
     
     print("\n" + "=" * 60)
     print("✅ اكتمل التصدير بنجاح!")
     print("=" * 60)
     print(f"📊 Excel: {xls}")
     print(f"🌐 HTML: {html}")
-    if pdf:
-        print(f"📄 PDF: {pdf}")
+    print(f"📄 PDF: {pdf}")
     print("=" * 60)
     
     return {
         "excel": xls,
         "html": html,
         "pdf": pdf,
-        "events_count": len(events)
+        "events_count": count
     }
 
 if __name__ == "__main__":
-    run()
+    try:
+        run()
+    except (FetchError, ExportError):
+        sys.exit(1)
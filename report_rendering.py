@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+وحدة عرض التقارير المشتركة
+Shared Report Rendering Module
+
+بيئة Jinja2 واحدة مشتركة بين مولدات التقارير (parkpow_export و parkpow_licenses_report):
+- القوالب تُسجل بالاسم وتُترجم مرة واحدة ثم تُعاد من ذاكرة البيئة
+- ذاكرة bytecode على القرص (مجلد خاص بالمستخدم 0700) تُلغي كلفة الترجمة بين التشغيلات
+- الكتابة إلى الملفات تدفقية عبر generate() دون بناء النص كاملاً في الذاكرة
+
+One Jinja2 environment shared by the report generators:
+- templates are registered by name, compiled once and reused from the environment cache
+- an on-disk bytecode cache (Jinja's per-user 0700 directory) removes compile cost across runs
+- file output is streamed through generate() without building the whole string
+"""
+
+import os
+
+from jinja2 import DictLoader, Environment, FileSystemBytecodeCache, select_autoescape
+
+# مجلد ذاكرة bytecode للقوالب (اختياري عبر REPORT_TEMPLATE_CACHE_DIR؛ يُنشأ بصلاحيات 0700)
+# الافتراضي: مجلد Jinja الخاص بالمستخدم مع التحقق من الملكية
+TEMPLATE_CACHE_DIR = os.environ.get("REPORT_TEMPLATE_CACHE_DIR")
+
+_templates = {}
+_environment = None
+
+
+def register_template(name, source):
+    """
+    تسجيل قالب باسم (الاسم المنتهي بـ .html يُفعّل الترميز التلقائي)
+
+    Args:
+        name (str): اسم القالب
+        source (str): نص القالب
+    """
+    _templates[name] = source
+
+
+def get_environment():
+    """
+    بيئة Jinja2 المشتركة (تُنشأ مرة واحدة)
+
+    Returns:
+        Environment: البيئة المشتركة
+    """
+    global _environment
+    if _environment is None:
+        if TEMPLATE_CACHE_DIR:
+            os.makedirs(TEMPLATE_CACHE_DIR, mode=0o700, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+        else:
+            bytecode_cache = FileSystemBytecodeCache()
+        _environment = Environment(
+            loader=DictLoader(_templates),
+            bytecode_cache=bytecode_cache,
+            autoescape=select_autoescape(["html"]),
+            auto_reload=False,
+        )
+    return _environment
+
+
+def get_template(name):
+    """
+    القالب المترجم مسبقاً بالاسم
+
+    Args:
+        name (str): اسم القالب المسجل
+    """
+    return get_environment().get_template(name)
+
+
+def render(name, **context):
+    """
+    عرض قالب إلى نص
+
+    Args:
+        name (str): اسم القالب المسجل
+        **context: متغيرات القالب
+    """
+    return get_template(name).render(**context)
+
+
+def render_to_file(name, path, **context):
+    """
+    كتابة القالب تدفقياً إلى ملف دون بناء النص كاملاً في الذاكرة
+
+    Args:
+        name (str): اسم القالب المسجل
+        path (str): مسار الملف
+        **context: متغيرات القالب
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(get_template(name).generate(**context))
+    return path
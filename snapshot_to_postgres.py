@@ -18,19 +18,28 @@
 import os
 import sys
 import argparse
+import asyncio
 import hashlib
+import itertools
+import json
 import mimetypes
 import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 from io import BytesIO
 from datetime import datetime
 
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
 import requests
 from dotenv import load_dotenv
 from tqdm import tqdm
 import psycopg2
 from psycopg2 import Binary
-from psycopg2.extras import Json, register_uuid
+from psycopg2.extras import Json, execute_values, register_uuid
 
 # Load environment variables
 load_dotenv()
@@ -46,6 +55,7 @@ S3_BUCKET = os.getenv("S3_BUCKET")
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", ".plate_response_cache")
 
 # Global variables initialized in main()
 boto3_client = None
@@ -53,24 +63,72 @@ HEADERS = {}
 API_URL = None  # Will be set based on PLATE_API_TYPE
 
 
+IMAGE_READ_CHUNK = 1024 * 1024
+
+
+def _read_into(buffer, chunks, sha256):
+    """
+    انسخ الأجزاء إلى المخزن مع تحديث SHA256 أثناء القراءة
+    """
+    for chunk in chunks:
+        sha256.update(chunk)
+        buffer += chunk
+    return buffer
+
+
+def read_image(path_or_url):
+    """
+    اقرأ الصورة مرة واحدة من ملف محلي أو URL واحسب SHA256 أثناء القراءة
+    Read the image once into a single buffer, hashing it incrementally
+    
+    يُعاد استخدام المخزن نفسه في رفع S3 وطلب API وقاعدة البيانات دون نسخ إضافية
+    The same buffer is reused for S3, the multipart post and the database
+    
+    Returns:
+        (bytearray, sha256 hexdigest)
+    """
+    sha256 = hashlib.sha256()
+    
+    if urlparse(path_or_url).scheme in ("http", "https"):
+        with requests.get(path_or_url, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            buffer = _read_into(bytearray(), response.iter_content(IMAGE_READ_CHUNK), sha256)
+        return buffer, sha256.hexdigest()
+    
+    with open(path_or_url, "rb", buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        offset = 0
+        while offset < size:
+            n = f.readinto(view[offset:offset + IMAGE_READ_CHUNK])
+            if not n:
+                break
+            sha256.update(view[offset:offset + n])
+            offset += n
+        view.release()
+        # الملف قد يتغير حجمه أثناء القراءة
+        if offset < size:
+            del buffer[offset:]
+        else:
+            buffer = _read_into(buffer, iter(lambda: f.read(IMAGE_READ_CHUNK), b""), sha256)
+    return buffer, sha256.hexdigest()
+
+
 def get_image_bytes(path_or_url):
     """
     احصل على بايتات الصورة من ملف محلي أو URL
     """
-    if urlparse(path_or_url).scheme in ("http", "https"):
-        response = requests.get(path_or_url, timeout=30)
-        response.raise_for_status()
-        return response.content
-    else:
-        with open(path_or_url, "rb") as f:
-            return f.read()
+    return read_image(path_or_url)[0]
 
 
-def calculate_image_metadata(image_bytes, path_or_url):
+def calculate_image_metadata(image_bytes, path_or_url, sha256_hash=None):
     """
     احسب البيانات الوصفية للصورة: SHA256، MIME type، الحجم
+    (يُمرر sha256_hash إذا حُسب أثناء القراءة لتجنب المرور على الصورة مرة أخرى)
     """
-    sha256_hash = hashlib.sha256(image_bytes).hexdigest()
+    if sha256_hash is None:
+        sha256_hash = hashlib.sha256(image_bytes).hexdigest()
     size = len(image_bytes)
     
     # تحديد MIME type
@@ -91,13 +149,14 @@ def calculate_image_metadata(image_bytes, path_or_url):
     return sha256_hash, mime_type, size
 
 
-def upload_to_s3(image_bytes, filename, mime_type):
+def upload_to_s3(image_bytes, filename, mime_type, sha256_hash=None):
     """
     ارفع الصورة إلى S3 وأرجع الـ URL
     """
     try:
         # استخدام SHA256 كاسم للملف لتجنب التكرار
-        sha256_hash = hashlib.sha256(image_bytes).hexdigest()
+        if sha256_hash is None:
+            sha256_hash = hashlib.sha256(image_bytes).hexdigest()
         extension = mimetypes.guess_extension(mime_type) or '.jpg'
         s3_key = f"plate-snapshots/{sha256_hash}{extension}"
         
@@ -124,10 +183,15 @@ def upload_to_s3(image_bytes, filename, mime_type):
         return None
 
 
-def send_to_plate_recognizer(image_bytes, mime_type='image/jpeg'):
+API_MAX_RETRIES = 3
+
+
+def send_to_plate_recognizer(image_bytes, mime_type='image/jpeg', max_retries=API_MAX_RETRIES):
     """
     Send image to Plate Recognizer API (Snapshot or SDK) and return response.
     Supports both cloud-based Snapshot API and on-premise SDK/Server.
+    
+    max_retries=1 disables the internal retries (the async path retries through its rate limiter).
     """
     # Determine file extension from mime type
     ext = mime_type.split('/')[-1] if '/' in mime_type else 'jpg'
@@ -136,7 +200,6 @@ def send_to_plate_recognizer(image_bytes, mime_type='image/jpeg'):
     files = {"upload": (filename, image_bytes, mime_type)}
     
     # Retry logic
-    max_retries = 3
     for attempt in range(max_retries):
         try:
             response = requests.post(
@@ -156,6 +219,56 @@ def send_to_plate_recognizer(image_bytes, mime_type='image/jpeg'):
 
 
 
+def find_existing_snapshot(conn, sha256_hash):
+    """
+    ابحث عن صورة مُدخلة مسبقاً بنفس SHA256 (يستخدم idx_vehicle_image_sha256)
+    Return (id, raw_response) of an already ingested image, or None
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT id, raw_response FROM vehicle_snapshots WHERE image_sha256 = %s LIMIT 1",
+            (sha256_hash,)
+        )
+        return cur.fetchone()
+
+
+def response_cache_path(cache_dir, sha256_hash):
+    """
+    مسار رد API المخزن محلياً لصورة معينة
+    """
+    return os.path.join(cache_dir, sha256_hash[:2], f"{sha256_hash}.json")
+
+
+def load_cached_response(cache_dir, sha256_hash):
+    """
+    اقرأ رد Plate Recognizer المخزن محلياً لهذه الصورة إن وجد
+    """
+    if not cache_dir:
+        return None
+    try:
+        with open(response_cache_path(cache_dir, sha256_hash), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cached_response(cache_dir, sha256_hash, resp):
+    """
+    خزّن رد Plate Recognizer محلياً (كتابة ذرية حتى لا يبقى ملف ناقص)
+    """
+    if not cache_dir:
+        return
+    path = response_cache_path(cache_dir, sha256_hash)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(resp, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"  تحذير: تعذر حفظ الرد في الذاكرة المحلية: {e}")
+
+
 def parse_plate_recognizer_response(resp, confidence_threshold=0.0):
     """
     Parse Plate Recognizer response and extract relevant information.
@@ -171,6 +284,7 @@ def parse_plate_recognizer_response(resp, confidence_threshold=0.0):
         "colors": None,
         "bbox": None,
         "raw_response": resp,
+        "image_url": None,
         "meta": {}
     }
     
@@ -222,40 +336,645 @@ def parse_plate_recognizer_response(resp, confidence_threshold=0.0):
     return parsed
 
 
+SNAPSHOT_INSERT_SQL = """
+    INSERT INTO vehicle_snapshots
+    (snapshot_ref, camera_id, captured_at, plate_text, plate_confidence, 
+     makes_models, colors, bbox, raw_response, image_url, 
+     image_data, image_mime, image_size, image_sha256, meta)
+    VALUES %s
+    RETURNING id
+"""
+
+
+def snapshot_row(record, image_data=None):
+    """
+    حوّل السجل إلى صف بترتيب أعمدة SNAPSHOT_INSERT_SQL
+    """
+    return (
+        record["snapshot_ref"],
+        record["camera_id"],
+        record["captured_at"],
+        record["plate_text"],
+        record["plate_confidence"],
+        Json(record["makes_models"]) if record["makes_models"] else None,
+        Json(record["colors"]) if record["colors"] else None,
+        Json(record["bbox"]) if record["bbox"] else None,
+        Json(record["raw_response"]),
+        record["image_url"],
+        Binary(image_data) if image_data else None,
+        record.get("image_mime"),
+        record.get("image_size"),
+        record.get("image_sha256"),
+        Json(record["meta"])
+    )
+
+
 def insert_into_db(conn, record, image_data=None):
     """
     إدخال السجل في قاعدة البيانات
     """
     with conn.cursor() as cur:
-        cur.execute("""
-            INSERT INTO vehicle_snapshots
-            (snapshot_ref, camera_id, captured_at, plate_text, plate_confidence, 
-             makes_models, colors, bbox, raw_response, image_url, 
-             image_data, image_mime, image_size, image_sha256, meta)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-            RETURNING id
-        """, (
-            record["snapshot_ref"],
-            record["camera_id"],
-            record["captured_at"],
-            record["plate_text"],
-            record["plate_confidence"],
-            Json(record["makes_models"]) if record["makes_models"] else None,
-            Json(record["colors"]) if record["colors"] else None,
-            Json(record["bbox"]) if record["bbox"] else None,
-            Json(record["raw_response"]),
-            record["image_url"],
-            Binary(image_data) if image_data else None,
-            record.get("image_mime"),
-            record.get("image_size"),
-            record.get("image_sha256"),
-            Json(record["meta"])
-        ))
+        cur.execute(
+            SNAPSHOT_INSERT_SQL % "(%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)",
+            snapshot_row(record, image_data)
+        )
         new_id = cur.fetchone()[0]
         conn.commit()
         return new_id
 
 
+def insert_many_into_db(conn, rows):
+    """
+    إدخال عدة صفوف بطلب واحد (execute_values) ومعاملة واحدة، وإرجاع المعرفات بالترتيب
+    """
+    with conn.cursor() as cur:
+        ids = execute_values(cur, SNAPSHOT_INSERT_SQL, rows, page_size=len(rows), fetch=True)
+        conn.commit()
+        return [row[0] for row in ids]
+
+
+def iter_image_items(path, skip=0):
+    """
+    اقرأ ملف الصور سطراً سطراً دون تحميله كاملاً في الذاكرة
+    Yield (index, line_no, item) for every non-empty, non-comment line, skipping the first `skip` items
+    """
+    index = 0
+    with open(path, "r") as f:
+        for line_no, line in enumerate(f, 1):
+            item = line.strip()
+            if not item or item.startswith('#'):
+                continue
+            if index >= skip:
+                yield index, line_no, item
+            index += 1
+
+
+def count_image_items(path):
+    """
+    عدّ الصور في الملف (قراءة متدفقة) لعرض شريط التقدم
+    """
+    return sum(1 for _ in iter_image_items(path))
+
+
+class IngestCheckpoint:
+    """
+    نقطة استئناف لملف الصور: عدد العناصر المكتملة بالترتيب، آخر سطر، والعدادات
+    Resumable progress for an images list
+    
+    مع المعالجة المتوازية تكتمل العناصر بغير ترتيب، لذا يُحفظ فقط أطول تسلسل
+    مكتمل من البداية، وذلك بعد كتابة الدفعة المعلقة في قاعدة البيانات
+    Items may finish out of order, so only the contiguous completed prefix is saved,
+    and only after the pending batch has been written to the database
+    
+    العناصر الفاشلة تُحفظ منفصلة في failed مع ترتيبها في الملف ويُعاد تنفيذها عند --resume
+    إن كانت قبل items_done؛ ما بعده يعالجه المرور على الملف فلا يُنفذ مرتين
+    Failed items are kept with their index in the file; --resume retries those before
+    items_done and leaves the rest to the file pass so nothing runs twice
+    """
+    
+    def __init__(self, path, images_file, every=100, items_done=0, line=0, failed=()):
+        self.path = path
+        self.images_file = images_file
+        self.every = max(1, every)
+        self.items_done = items_done
+        self.line = line
+        self.failed = self._failed_map(failed)
+        self._indexes = {}
+        self._finished = {}
+        self._since_save = 0
+    
+    @staticmethod
+    def _failed_map(failed):
+        """
+        item -> index (None لنقاط الاستئناف القديمة التي حفظت قائمة فقط)
+        """
+        if isinstance(failed, dict):
+            return dict(failed)
+        return dict.fromkeys(failed)
+    
+    @staticmethod
+    def load(path):
+        """
+        اقرأ نقطة الاستئناف المحفوظة أو None
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def mark_done(self, index, line_no):
+        """
+        سجّل اكتمال عنصر (index = None لعنصر أُعيدت محاولته).
+        يرجع True عندما يحين وقت حفظ نقطة الاستئناف
+        """
+        self._since_save += 1
+        if index is None:
+            return self._since_save >= self.every
+        self._finished[index] = line_no
+        while self.items_done in self._finished:
+            self.line = self._finished.pop(self.items_done)
+            self.items_done += 1
+        return self._since_save >= self.every
+    
+    def track(self, index, item):
+        """
+        احفظ ترتيب عنصر في الملف حتى تصل نتيجته (قد تتأخر حتى كتابة الدفعة)
+        """
+        if index is not None:
+            self._indexes[item] = index
+    
+    def record(self, item, ok):
+        """
+        سجّل نتيجة عنصر: الفاشل يُضاف إلى قائمة إعادة المحاولة والناجح يُزال منها
+        """
+        index = self._indexes.pop(item, None)
+        if ok:
+            self.failed.pop(item, None)
+        elif index is not None:
+            self.failed[item] = index
+        else:
+            # عنصر أُعيدت محاولته: يبقى بترتيبه الأصلي
+            self.failed.setdefault(item, None)
+    
+    def retry_items(self):
+        """
+        العناصر الفاشلة قبل items_done بصيغة iter_image_items لإعادة معالجتها قبل بقية الملف.
+        الفاشلة بعده تُحذف من القائمة لأن المرور على الملف سيعالجها؛ يرجع (العناصر، عدد المحذوفة)
+        """
+        retries, dropped = [], []
+        for item, index in self.failed.items():
+            if index is None or index < self.items_done:
+                retries.append((None, None, item))
+            else:
+                dropped.append(item)
+        for item in dropped:
+            del self.failed[item]
+        return retries, len(dropped)
+    
+    def save(self, counts):
+        """
+        احفظ نقطة الاستئناف (كتابة ذرية)
+        """
+        self._since_save = 0
+        data = {
+            "images_file": os.path.abspath(self.images_file),
+            "items_done": self.items_done,
+            "line": self.line,
+            "failed": self.failed,
+            "counts": counts,
+            "updated_at": datetime.now().isoformat()
+        }
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"  تحذير: تعذر حفظ نقطة الاستئناف: {e}")
+
+
+def peak_rss_mb():
+    """
+    ذروة استهلاك الذاكرة (RSS) للعملية بالميغابايت، أو None إذا لم تكن متاحة
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss بالكيلوبايت على Linux وبالبايت على macOS
+    if sys.platform == "darwin":
+        peak /= 1024
+    return peak / 1024
+
+
+def new_counts():
+    """
+    عدادات نتائج المعالجة
+    """
+    return {"success": 0, "error": 0, "skipped": 0, "duplicate": 0, "cache_hit": 0}
+
+
+def store_image(image_bytes, item, mime_type, sha256_hash=None):
+    """
+    خزّن الصورة حسب STORE_IMAGES
+    Returns (image_url_stored, image_data_to_store); image_url_stored is None on S3 failure
+    """
+    if STORE_IMAGES == "s3":
+        return upload_to_s3(image_bytes, item, mime_type, sha256_hash), None
+    return None, image_bytes
+
+
+def build_record(resp, item, sha256_hash, mime_type, size, image_url_stored, confidence_threshold):
+    """
+    حوّل رد API إلى سجل جاهز للإدخال، أو None إذا كانت الثقة أقل من الحد
+    """
+    record = parse_plate_recognizer_response(resp, confidence_threshold)
+    if record is None:
+        return None
+    
+    record["snapshot_ref"] = record["snapshot_ref"] or sha256_hash
+    if STORE_IMAGES == "s3" and image_url_stored:
+        record["image_url"] = image_url_stored
+    elif not record["image_url"] and urlparse(item).scheme in ("http", "https"):
+        record["image_url"] = item
+    
+    record["image_sha256"] = sha256_hash
+    record["image_mime"] = mime_type
+    record["image_size"] = size
+    return record
+
+
+def insert_or_rollback(conn, record, image_data, item):
+    """
+    أدخل السجل، وتراجع عن المعاملة عند الخطأ. يرجع المعرف أو None
+    """
+    try:
+        new_id = insert_into_db(conn, record, image_data)
+        print(f"  ✓ تم إدخال السجل {new_id} للصورة {item}")
+        return new_id
+    except Exception as e:
+        print(f"  خطأ في إدخال DB لـ {item}: {e}")
+        conn.rollback()
+        return None
+
+
+class SnapshotBatchWriter:
+    """
+    كاتب دفعات لجدول vehicle_snapshots
+    Buffers parsed records and writes them with execute_values, one transaction per batch
+    
+    إذا فشلت دفعة كاملة يُعاد إدخال صفوفها واحداً تلو الآخر، فلا يُسقط صف تالف بقية الدفعة
+    If a whole batch fails its rows are retried one by one, so a bad row cannot sink the batch
+    
+    نتائج الكتابة (item, ok) تُجمع داخلياً ويسحبها المستدعي عبر take_results()،
+    فلا يلمس الكاتب عدادات المستدعي من خيط قاعدة البيانات
+    Write results are collected and handed back through take_results(), so all counting
+    happens on the caller's side
+    """
+    
+    def __init__(self, conn, batch_size=1, flush_interval=5.0):
+        """
+        Args:
+            conn: اتصال psycopg2
+            batch_size: عدد السجلات في كل دفعة (1 = إدخال فوري)
+            flush_interval: أقصى مدة بالثواني يبقى فيها سجل في الذاكرة
+        """
+        self.conn = conn
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._pending_hashes = set()
+        self._oldest = None
+        self._results = []
+    
+    def contains(self, sha256_hash):
+        """
+        هل الصورة موجودة في دفعة لم تُكتب بعد؟
+        """
+        return sha256_hash in self._pending_hashes
+    
+    def add(self, record, image_data, item):
+        """
+        أضف سجلاً إلى الدفعة واكتبها عند امتلائها أو انتهاء المهلة
+        """
+        self._pending.append((record, image_data, item))
+        self._pending_hashes.add(record.get("image_sha256"))
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        
+        if (len(self._pending) >= self.batch_size
+                or time.monotonic() - self._oldest >= self.flush_interval):
+            self.flush()
+    
+    def flush(self):
+        """
+        اكتب السجلات المعلقة
+        """
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        self._pending_hashes = set()
+        self._oldest = None
+        
+        try:
+            ids = insert_many_into_db(self.conn, [snapshot_row(r, d) for r, d, _ in pending])
+        except Exception as e:
+            self.conn.rollback()
+            if len(pending) > 1:
+                print(f"  فشل إدخال دفعة من {len(pending)} سجل، إعادة المحاولة سجلاً سجلاً: {e}")
+            for record, image_data, item in pending:
+                ok = insert_or_rollback(self.conn, record, image_data, item) is not None
+                self._results.append((item, ok))
+            return
+        
+        for new_id, (_, _, item) in zip(ids, pending):
+            print(f"  ✓ تم إدخال السجل {new_id} للصورة {item}")
+            self._results.append((item, True))
+    
+    def take_results(self):
+        """
+        أرجع نتائج الكتابة [(item, ok)] منذ آخر استدعاء وأفرغها
+        """
+        results, self._results = self._results, []
+        return results
+    
+    def flush_results(self):
+        """
+        اكتب السجلات المعلقة وأرجع كل النتائج غير المسحوبة
+        """
+        self.flush()
+        return self.take_results()
+    
+    def close(self):
+        """
+        اكتب ما تبقى في الدفعة وأرجع النتائج غير المسحوبة
+        """
+        return self.flush_results()
+
+
+def count_results(counts, checkpoint, results):
+    """
+    أضف نتائج الكتابة [(item, ok)] إلى العدادات وإلى قائمة الفاشلة في نقطة الاستئناف
+    """
+    for item, ok in results:
+        counts["success" if ok else "error"] += 1
+        checkpoint.record(item, ok)
+
+
+def count_status(counts, checkpoint, index, item, status):
+    """
+    احتسب حالة عنصر انتهت معالجته (queued تُحتسب لاحقاً عند كتابة الدفعة)
+    """
+    checkpoint.track(index, item)
+    if index is None:
+        # عنصر أُعيدت محاولته: احتُسب خطأً في التشغيل السابق
+        counts["error"] -= 1
+    if status != "queued":
+        counts[status] += 1
+        checkpoint.record(item, status != "error")
+
+
+def find_duplicate(conn, writer, sha256_hash, response_cache=None):
+    """
+    أرجع وصفاً للنسخة الموجودة من الصورة (في قاعدة البيانات أو في دفعة معلقة) أو None
+    
+    عند وجودها في قاعدة البيانات يُنسخ raw_response المخزن إلى الذاكرة المحلية إن لم يكن فيها،
+    فتمتلئ ذاكرة محلية جديدة أو ممسوحة من الردود المدفوعة سابقاً دون استدعاء API
+    A DB hit backfills the on-disk response cache from the stored raw_response
+    """
+    if writer.contains(sha256_hash):
+        return "دفعة معلقة"
+    existing = find_existing_snapshot(conn, sha256_hash)
+    if existing:
+        snapshot_id, raw_response = existing
+        if (response_cache and raw_response is not None
+                and not os.path.exists(response_cache_path(response_cache, sha256_hash))):
+            save_cached_response(response_cache, sha256_hash, raw_response)
+        return f"السجل {snapshot_id}"
+    return None
+
+
+def process_item(item, conn, writer, args, response_cache, counts):
+    """
+    عالج صورة واحدة بالتسلسل وأرجع حالتها: queued / error / skipped / duplicate
+    """
+    # 1. اقرأ الصورة مرة واحدة مع حساب SHA256 أثناء القراءة
+    image_bytes, sha256_hash = read_image(item)
+    
+    # 2. احسب البيانات الوصفية
+    sha256_hash, mime_type, size = calculate_image_metadata(image_bytes, item, sha256_hash)
+    
+    # 2.1 تخطي الصور المُدخلة مسبقاً
+    if not args.no_dedup:
+        existing = find_duplicate(conn, writer, sha256_hash, response_cache)
+        if existing:
+            print(f"  تخطي {item}: الصورة موجودة مسبقاً ({existing})")
+            return "duplicate"
+    
+    # 3. تخزين الصورة حسب الوضع المحدد
+    image_url_stored, image_data_to_store = store_image(image_bytes, item, mime_type, sha256_hash)
+    if STORE_IMAGES == "s3" and not image_url_stored:
+        print(f"  فشل رفع الصورة إلى S3: {item}")
+        return "error"
+    
+    # 4. إرسال إلى Plate Recognizer API
+    resp = load_cached_response(response_cache, sha256_hash)
+    if resp is not None:
+        counts["cache_hit"] += 1
+    else:
+        try:
+            resp = send_to_plate_recognizer(image_bytes, mime_type)
+        except Exception as e:
+            print(f"  خطأ عند إرسال {item}: {e}")
+            return "error"
+        save_cached_response(response_cache, sha256_hash, resp)
+    
+    # 5-7. استخراج البيانات من الرد وفحص حد الثقة
+    record = build_record(resp, item, sha256_hash, mime_type, size,
+                          image_url_stored, args.confidence_threshold)
+    if record is None:
+        print(f"  تخطي {item}: الثقة أقل من الحد {args.confidence_threshold}")
+        return "skipped"
+    
+    # 8. إدخال في قاعدة البيانات (تُحتسب النتيجة عند كتابة الدفعة)
+    writer.add(record, image_data_to_store, item)
+    return "queued"
+
+
+def ingest_sequential(items, total, conn, args, response_cache, counts, checkpoint):
+    """
+    المعالجة التسلسلية مع تأخير ثابت بين الطلبات (--delay)
+    """
+    writer = SnapshotBatchWriter(conn, args.batch_size, args.flush_interval)
+    try:
+        for index, line_no, item in tqdm(items, total=total, desc="Processing images"):
+            try:
+                status = process_item(item, conn, writer, args, response_cache, counts)
+            except Exception as e:
+                print(f"  خطأ في معالجة {item}: {e}")
+                status = "error"
+            count_status(counts, checkpoint, index, item, status)
+            count_results(counts, checkpoint, writer.take_results())
+            
+            if checkpoint.mark_done(index, line_no):
+                count_results(counts, checkpoint, writer.flush_results())
+                checkpoint.save(counts)
+            
+            # الصور المكررة لا تستدعي API، فلا داعي للانتظار
+            if status != "duplicate":
+                time.sleep(args.delay)
+    finally:
+        count_results(counts, checkpoint, writer.close())
+        checkpoint.save(counts)
+    return counts
+
+
+class TokenBucket:
+    """
+    محدد معدل (Token Bucket) مشترك بين جميع المهام غير المتزامنة
+    Global token-bucket rate limiter shared by all async workers
+    """
+    
+    def __init__(self, rate, burst=None):
+        """
+        Args:
+            rate: عدد الطلبات المسموح بها في الثانية (0 = بدون حد)
+            burst: أقصى عدد من الطلبات المتتالية (افتراضي: max(1, rate))
+        """
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """
+        انتظر حتى يتوفر رمز واحد
+        """
+        if not self.rate:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+async def process_item_async(item, conn, writer, args, response_cache, counts, io_pool, db_pool, limiter, in_flight):
+    """
+    عالج صورة واحدة: الجلب والرفع والتعرف تتم بالتوازي، وكل عمليات
+    قاعدة البيانات تمر عبر خيط كتابة واحد (db_pool)
+    """
+    loop = asyncio.get_running_loop()
+    
+    def run_io(func, *func_args):
+        return loop.run_in_executor(io_pool, func, *func_args)
+    
+    def run_db(func, *func_args):
+        return loop.run_in_executor(db_pool, func, *func_args)
+    
+    image_bytes, sha256_hash = await run_io(read_image, item)
+    sha256_hash, mime_type, size = calculate_image_metadata(image_bytes, item, sha256_hash)
+    
+    if not args.no_dedup:
+        # الصورة نفسها قد تظهر مرتين في القائمة وتكون الأولى قيد المعالجة
+        if sha256_hash in in_flight:
+            print(f"  تخطي {item}: الصورة قيد المعالجة في مهمة أخرى")
+            return "duplicate"
+        in_flight.add(sha256_hash)
+    
+    try:
+        return await _recognize_and_store_async(
+            item, image_bytes, sha256_hash, mime_type, size, conn, writer, args,
+            response_cache, counts, run_io, run_db, limiter
+        )
+    finally:
+        # بعد انتهاء المعالجة يتولى فحص قاعدة البيانات اكتشاف التكرار
+        in_flight.discard(sha256_hash)
+
+
+async def _recognize_and_store_async(item, image_bytes, sha256_hash, mime_type, size, conn, writer, args,
+                                     response_cache, counts, run_io, run_db, limiter):
+    """
+    المراحل بعد حساب SHA256: فحص التكرار، التخزين، التعرف، والإدخال
+    """
+    if not args.no_dedup:
+        existing = await run_db(find_duplicate, conn, writer, sha256_hash, response_cache)
+        if existing:
+            print(f"  تخطي {item}: الصورة موجودة مسبقاً ({existing})")
+            return "duplicate"
+    
+    image_url_stored, image_data_to_store = await run_io(store_image, image_bytes, item, mime_type, sha256_hash)
+    if STORE_IMAGES == "s3" and not image_url_stored:
+        print(f"  فشل رفع الصورة إلى S3: {item}")
+        return "error"
+    
+    resp = await run_io(load_cached_response, response_cache, sha256_hash)
+    if resp is not None:
+        counts["cache_hit"] += 1
+    else:
+        # كل محاولة (بما فيها إعادة المحاولة بعد 429) تأخذ رمزاً من المحدد فلا يُتجاوز --rate
+        # Every attempt, retries included, takes a token so retries cannot exceed --rate
+        for attempt in range(API_MAX_RETRIES):
+            await limiter.acquire()
+            try:
+                resp = await run_io(send_to_plate_recognizer, image_bytes, mime_type, 1)
+                break
+            except requests.exceptions.RequestException as e:
+                if attempt == API_MAX_RETRIES - 1:
+                    print(f"  خطأ عند إرسال {item}: {e}")
+                    return "error"
+                print(f"  Retry {attempt + 1}/{API_MAX_RETRIES} after error: {e}")
+                await asyncio.sleep(2 ** attempt)
+            except Exception as e:
+                print(f"  خطأ عند إرسال {item}: {e}")
+                return "error"
+        await run_io(save_cached_response, response_cache, sha256_hash, resp)
+    
+    record = build_record(resp, item, sha256_hash, mime_type, size,
+                          image_url_stored, args.confidence_threshold)
+    if record is None:
+        print(f"  تخطي {item}: الثقة أقل من الحد {args.confidence_threshold}")
+        return "skipped"
+    
+    await run_db(writer.add, record, image_data_to_store, item)
+    return "queued"
+
+
+async def ingest_async(items, total, conn, args, response_cache, counts, checkpoint):
+    """
+    المعالجة غير المتزامنة: --concurrency مهمة تعمل معاً، ومعدل طلبات API
+    يضبطه محدد --rate بدلاً من التأخير الثابت
+    """
+    loop = asyncio.get_running_loop()
+    writer = SnapshotBatchWriter(conn, args.batch_size, args.flush_interval)
+    limiter = TokenBucket(args.rate)
+    in_flight = set()
+    progress = tqdm(total=total, desc="Processing images")
+    
+    # الكتابة على خيط قاعدة البيانات، والعدّ وحفظ نقطة الاستئناف على حلقة الأحداث فقط
+    async def flush_and_save():
+        count_results(counts, checkpoint, await loop.run_in_executor(db_pool, writer.flush_results))
+        checkpoint.save(counts)
+    
+    async def worker():
+        for index, line_no, item in items:
+            try:
+                status = await process_item_async(item, conn, writer, args, response_cache, counts,
+                                                  io_pool, db_pool, limiter, in_flight)
+            except Exception as e:
+                print(f"  خطأ في معالجة {item}: {e}")
+                status = "error"
+            count_status(counts, checkpoint, index, item, status)
+            if status == "queued":
+                count_results(counts, checkpoint, await loop.run_in_executor(db_pool, writer.take_results))
+            progress.update(1)
+            
+            if checkpoint.mark_done(index, line_no):
+                await flush_and_save()
+    
+    # psycopg2 connections must not be used from several threads at once:
+    # one dedicated thread performs every query and commit.
+    with ThreadPoolExecutor(max_workers=args.concurrency) as io_pool, \
+            ThreadPoolExecutor(max_workers=1) as db_pool:
+        tasks = [asyncio.ensure_future(worker()) for _ in range(args.concurrency)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # إيقاف بقية المهام عند فشل إحداها قبل الكتابة النهائية
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            await flush_and_save()
+    progress.close()
+    return counts
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -265,6 +984,20 @@ def main():
 Example usage:
   python snapshot_to_postgres.py --images images.txt --delay 1.0 --confidence-threshold 0.8
 
+Duplicate images (same SHA256) already in vehicle_snapshots are skipped, and
+API responses are cached on disk under --response-cache so re-runs over
+overlapping lists do not spend API quota again. Use --no-dedup to disable.
+
+Historical backfill with batched inserts (one INSERT ... VALUES round trip per batch):
+  python snapshot_to_postgres.py --images images.txt --batch-size 500 --delay 0
+
+Resume an interrupted run from its checkpoint (written every --checkpoint-every items);
+items that failed before the checkpoint position are saved and retried first:
+  python snapshot_to_postgres.py --images images.txt --resume
+
+Async mode (fetch, upload and recognition run concurrently; --rate replaces --delay):
+  python snapshot_to_postgres.py --images images.txt --concurrency 8 --rate 4
+
 Environment variables required:
   PLATE_API_KEY, DATABASE_URL
   PLATE_API_TYPE (snapshot or sdk, default: snapshot)
@@ -283,6 +1016,24 @@ Environment variables required:
     parser.add_argument("--delay", type=float, default=0.5, help="تأخير بين الطلبات بالثواني")
     parser.add_argument("--confidence-threshold", type=float, default=0.0, 
                        help="الحد الأدنى للثقة في نتيجة اللوحة (0.0-1.0)")
+    parser.add_argument("--response-cache", default=RESPONSE_CACHE_DIR,
+                       help="مجلد ردود API المخزنة حسب SHA256 (افتراضي: RESPONSE_CACHE_DIR أو .plate_response_cache)")
+    parser.add_argument("--no-dedup", action="store_true",
+                       help="تعطيل تخطي الصور المكررة وإعادة استخدام الردود المخزنة")
+    parser.add_argument("--batch-size", type=int, default=1,
+                       help="عدد السجلات في كل دفعة إدخال إلى قاعدة البيانات (1 = إدخال فوري)")
+    parser.add_argument("--flush-interval", type=float, default=5.0,
+                       help="أقصى مدة بالثواني قبل كتابة دفعة غير مكتملة")
+    parser.add_argument("--checkpoint", default=None,
+                       help="ملف نقطة الاستئناف (افتراضي: <images>.checkpoint.json)")
+    parser.add_argument("--checkpoint-every", type=int, default=100,
+                       help="حفظ نقطة الاستئناف كل N صورة")
+    parser.add_argument("--resume", action="store_true",
+                       help="استئناف المعالجة من آخر نقطة محفوظة مع تخطي الصور الموجودة في قاعدة البيانات")
+    parser.add_argument("--concurrency", type=int, default=1,
+                       help="عدد الصور المعالجة بالتوازي (أكبر من 1 يفعّل الوضع غير المتزامن)")
+    parser.add_argument("--rate", type=float, default=float(os.getenv("PLATE_API_RATE", "0") or 0),
+                       help="الحد الأقصى لطلبات API في الثانية في الوضع غير المتزامن (0 = بدون حد؛ افتراضي: PLATE_API_RATE)")
     args = parser.parse_args()
     
     # Validate environment variables after parsing args (so --help works without env vars)
@@ -368,21 +1119,47 @@ Environment variables required:
         print(f"ERROR: Unknown STORE_IMAGES value '{STORE_IMAGES}'. Must be 's3' or 'db'")
         sys.exit(1)
 
-    # Read images list
+    # Read images list (streamed; only counted up front for the progress bar)
     try:
-        with open(args.images, "r") as f:
-            items = [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+        total = count_image_items(args.images)
     except FileNotFoundError:
         print(f"ERROR: Images file not found: {args.images}")
         sys.exit(1)
     
-    if not items:
+    if not total:
         print("ERROR: No images found in file (empty or all lines are comments)")
         sys.exit(1)
     
-    print(f"Processing {len(items)} images...")
+    checkpoint_path = args.checkpoint or f"{args.images}.checkpoint.json"
+    counts = new_counts()
+    checkpoint = IngestCheckpoint(checkpoint_path, args.images, args.checkpoint_every)
+    if args.resume:
+        saved = IngestCheckpoint.load(checkpoint_path)
+        if saved and saved.get("images_file") == os.path.abspath(args.images):
+            checkpoint.items_done = saved.get("items_done", 0)
+            checkpoint.line = saved.get("line", 0)
+            checkpoint.failed = IngestCheckpoint._failed_map(saved.get("failed", []))
+            counts.update(saved.get("counts", {}))
+            print(f"Resuming after item {checkpoint.items_done} (line {checkpoint.line}) from {checkpoint_path}")
+            if args.no_dedup:
+                print("WARNING: --no-dedup disables the image_sha256 cross-check for items after the checkpoint")
+        else:
+            print(f"No matching checkpoint at {checkpoint_path}, starting from the beginning")
+    
+    retries, requeued = checkpoint.retry_items()
+    # الفاشلة بعد items_done ستُعالج في المرور على الملف: أزل خطأها المحتسب سابقاً
+    counts["error"] -= requeued
+    if retries:
+        print(f"Retrying {len(retries)} item(s) that failed in the previous run")
+    items = itertools.chain(retries, iter_image_items(args.images, skip=checkpoint.items_done))
+    remaining = total - checkpoint.items_done + len(retries)
+    
+    print(f"Processing {remaining} of {total} images...")
     print(f"Storage mode: {STORE_IMAGES}")
     print(f"Confidence threshold: {args.confidence_threshold}")
+    response_cache = None if args.no_dedup else args.response_cache
+    if response_cache:
+        print(f"Response cache: {response_cache}")
     print()
 
     # Connect to database
@@ -394,87 +1171,29 @@ Environment variables required:
         sys.exit(1)
 
     # Process images
-    success_count = 0
-    error_count = 0
-    skipped_count = 0
-    
-    for item in tqdm(items, desc="Processing images"):
-        try:
-            # 1. احصل على بايتات الصورة
-            image_bytes = get_image_bytes(item)
-            
-            # 2. احسب البيانات الوصفية
-            sha256_hash, mime_type, size = calculate_image_metadata(image_bytes, item)
-            
-            # 3. تخزين الصورة حسب الوضع المحدد
-            image_url_stored = None
-            image_data_to_store = None
-            
-            if STORE_IMAGES == "s3":
-                # رفع إلى S3
-                image_url_stored = upload_to_s3(image_bytes, item, mime_type)
-                if not image_url_stored:
-                    print(f"  فشل رفع الصورة إلى S3: {item}")
-                    error_count += 1
-                    time.sleep(args.delay)
-                    continue
-            elif STORE_IMAGES == "db":
-                # تخزين في قاعدة البيانات
-                image_data_to_store = image_bytes
-            
-            # 4. إرسال إلى Plate Recognizer API
-            try:
-                resp = send_to_plate_recognizer(image_bytes, mime_type)
-            except Exception as e:
-                print(f"  خطأ عند إرسال {item}: {e}")
-                error_count += 1
-                time.sleep(args.delay)
-                continue
-            
-            # 5. استخراج البيانات من الرد
-            record = parse_plate_recognizer_response(resp, args.confidence_threshold)
-            
-            # 6. فحص حد الثقة
-            if record is None:
-                print(f"  تخطي {item}: الثقة أقل من الحد {args.confidence_threshold}")
-                skipped_count += 1
-                time.sleep(args.delay)
-                continue
-            
-            # 7. إضافة البيانات الوصفية
-            record["snapshot_ref"] = record["snapshot_ref"] or sha256_hash
-            if STORE_IMAGES == "s3" and image_url_stored:
-                record["image_url"] = image_url_stored
-            elif not record["image_url"] and urlparse(item).scheme in ("http", "https"):
-                record["image_url"] = item
-            
-            record["image_sha256"] = sha256_hash
-            record["image_mime"] = mime_type
-            record["image_size"] = size
-            
-            # 8. إدخال في قاعدة البيانات
-            try:
-                new_id = insert_into_db(conn, record, image_data_to_store)
-                print(f"  ✓ تم إدخال السجل {new_id} للصورة {item}")
-                success_count += 1
-            except Exception as e:
-                print(f"  خطأ في إدخال DB لـ {item}: {e}")
-                conn.rollback()
-                error_count += 1
-            
-        except Exception as e:
-            print(f"  خطأ في معالجة {item}: {e}")
-            error_count += 1
-        
-        time.sleep(args.delay)
+    if args.concurrency < 1:
+        print("ERROR: --concurrency must be at least 1")
+        sys.exit(1)
+    if args.concurrency > 1:
+        print(f"Async ingest: concurrency={args.concurrency}, rate={args.rate or 'unlimited'} req/s")
+        counts = asyncio.run(ingest_async(items, remaining, conn, args, response_cache, counts, checkpoint))
+    else:
+        counts = ingest_sequential(items, remaining, conn, args, response_cache, counts, checkpoint)
 
     conn.close()
     print()
     print("=" * 60)
-    print(f"تمت معالجة {len(items)} صورة:")
-    print(f"  ✓ نجح: {success_count}")
-    print(f"  ✗ فشل: {error_count}")
-    print(f"  ⊘ متخطى: {skipped_count}")
+    print(f"تمت معالجة {checkpoint.items_done} من {total} صورة:")
+    print(f"  ✓ نجح: {counts['success']}")
+    print(f"  ✗ فشل: {counts['error']}")
+    print(f"  ⊘ متخطى: {counts['skipped']}")
+    print(f"  ≡ مكرر: {counts['duplicate']}")
+    print(f"  ↺ من الذاكرة المحلية: {counts['cache_hit']}")
+    if checkpoint.failed:
+        print(f"  ⟳ فاشلة محفوظة لإعادة المحاولة (--resume): {len(checkpoint.failed)}")
+    peak_rss = peak_rss_mb()
+    if peak_rss is not None:
+        print(f"  ذروة الذاكرة (Peak RSS): {peak_rss:.1f} MB")
     print("=" * 60)
 
 if __name__ == "__main__":